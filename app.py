@@ -7,52 +7,80 @@ import time
 import logging
 import signal
 import json
+import queue
+import logging.handlers
 from threading import Thread
 
+import cv2
 from flask import Flask, render_template, request, jsonify
 from flask_socketio import SocketIO
+from gevent import pywsgi
+from gevent.queue import Queue as GeventQueue
+from geventwebsocket.handler import WebSocketHandler
 
 from modules.camera_manager import CameraManager
 from modules.zone_detector import ZoneDetector
 from modules.gpio_controller import GPIOController
 from modules.config_manager import ConfigManager
 
-# Configure logging
+# Ensure logs directory exists
+os.makedirs('logs', exist_ok=True)
+os.makedirs('config', exist_ok=True)
+
+# Configure logging. Records are handed to a queue and formatted/written by a
+# listener thread, so camera and detector threads never block on log I/O.
+log_formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+log_handlers = [logging.StreamHandler(), logging.FileHandler('logs/app.log')]
+for handler in log_handlers:
+    handler.setFormatter(log_formatter)
+log_queue = queue.Queue(-1)
+log_listener = logging.handlers.QueueListener(log_queue, *log_handlers)
 logging.basicConfig(
     level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.StreamHandler(),
-        logging.FileHandler('logs/app.log')
-    ]
+    handlers=[logging.handlers.QueueHandler(log_queue)],
+    force=True  # Replace handlers installed by module imports
 )
+log_listener.start()
 logger = logging.getLogger(__name__)
 
-# Ensure logs directory exists
-os.makedirs('logs', exist_ok=True)
-os.makedirs('config', exist_ok=True)
-
 # Initialize Flask application
 app = Flask(__name__)
 app.config['SECRET_KEY'] = 'ams-zone-monitor-secret-key'
-socketio = SocketIO(app, async_mode='gevent', cors_allowed_origins="*")
+socketio = SocketIO(app, async_mode='gevent', logger=False, engineio_logger=False,
+                    cors_allowed_origins="*")
 
 # Initialize components
 config_manager = ConfigManager('config/config.json')
 config = config_manager.get_config()
 
+# Camera and detector threads already run OpenCV calls in parallel; letting
+# each call spawn its own worker pool oversubscribes the CPU. A single camera
+# has no such parallelism, so it may use more threads.
+system_config = config.get('system', {})
+cv_threads = system_config.get('opencv_threads')
+if cv_threads is None:
+    cv_threads = -1 if len(config.get('cameras', [])) <= 1 else 1
+cv2.setNumThreads(cv_threads)
+cv2.ocl.setUseOpenCL(False)
+
 gpio_controller = GPIOController(config.get('gpio', {}))
-camera_manager = CameraManager(config.get('cameras', []))
-zone_detector = ZoneDetector(
-    camera_manager,
-    gpio_controller,
-    config.get('zones', {}),
-    hailo_model_path=config.get('hailo', {}).get('model_path')
+camera_manager = CameraManager(
+    config.get('cameras', []),
+    cpu_affinity=config.get('system', {}).get('cpu_affinity', False)
 )
+zone_detector = ZoneDetector(camera_manager, gpio_controller, config)
 
 # Flag to control main loop
 running = True
 
+# Status updates are queued by a ticker and sent by a separate worker so a
+# slow client never delays status collection. Both run as background tasks
+# on the server's gevent hub, since Socket.IO can only emit from there.
+STATUS_INTERVAL = 1.0
+STATUS_HEARTBEAT_TICKS = 10  # Resend an unchanged status this often
+_BATCH_MAX = 10
+status_queue = GeventQueue(maxsize=100)
+
 # Signal handlers
 def signal_handler(sig, frame):
     global running
@@ -60,6 +88,7 @@ def signal_handler(sig, frame):
     running = False
     time.sleep(1)  # Allow time for threads to clean up
     gpio_controller.cleanup()
+    log_listener.stop()
     sys.exit(0)
 
 signal.signal(signal.SIGINT, signal_handler)
@@ -119,23 +148,77 @@ def handle_connect():
 def handle_disconnect():
     logger.info(f"Client disconnected: {request.sid}")
 
+def _status_key(status_data):
+    """Reduce a status snapshot to the state clients react to.
+    
+    Timestamps and frame counters change on every snapshot, so they are
+    left out; clients still receive them with each emitted snapshot.
+    
+    Args:
+        status_data: Snapshot built by emit_status
+        
+    Returns:
+        Hashable tuple of camera connection, zone occupancy and relay state
+    """
+    return (
+        tuple((camera_id, status['connected'], status['connection_attempts'])
+              for camera_id, status in status_data['cameras'].items()),
+        tuple((zone_id, status['has_person'])
+              for zone_id, status in status_data['zones'].items()),
+        status_data['gpio']['active']
+    )
+
 def emit_status():
-    """Emit status updates to connected clients."""
+    """Queue a status snapshot for connected clients when it changes.
+    
+    Snapshots whose state is unchanged are skipped except for a periodic
+    heartbeat.
+    """
+    last_key = None
+    ticks_since_emit = 0
     while running:
+        socketio.sleep(STATUS_INTERVAL)
         status_data = {
             'cameras': camera_manager.get_camera_status(),
             'zones': zone_detector.get_zone_status(),
             'gpio': gpio_controller.get_status()
         }
-        socketio.emit('status_update', status_data)
-        time.sleep(1)
+        key = _status_key(status_data)
+        ticks_since_emit += 1
+        if key == last_key and ticks_since_emit < STATUS_HEARTBEAT_TICKS:
+            continue
+        last_key = key
+        ticks_since_emit = 0
+        
+        try:
+            status_queue.put_nowait(status_data)
+        except queue.Full:
+            # Drop the oldest snapshot to make room
+            try:
+                status_queue.get_nowait()
+            except queue.Empty:
+                pass
+            status_queue.put_nowait(status_data)
+
+def _emit_worker():
+    """Send queued status updates, coalescing a backlog into the newest one."""
+    while running:
+        try:
+            payload = status_queue.get(timeout=STATUS_INTERVAL)
+        except queue.Empty:
+            continue
+        for _ in range(_BATCH_MAX - 1):
+            try:
+                payload = status_queue.get_nowait()
+            except queue.Empty:
+                break
+        socketio.emit('status_update', payload)
 
 # Main application entry point
 def main():
-    # Start status emission thread
-    status_thread = Thread(target=emit_status)
-    status_thread.daemon = True
-    status_thread.start()
+    # Start status emission on the web server's hub
+    socketio.start_background_task(emit_status)
+    socketio.start_background_task(_emit_worker)
     
     # Start zone detector
     detector_thread = Thread(target=zone_detector.run)
@@ -144,7 +227,13 @@ def main():
     
     # Start the web server
     logger.info("Starting AMS Zone Monitor")
-    socketio.run(app, host='0.0.0.0', port=config.get('web', {}).get('port', 7800))
+    server = pywsgi.WSGIServer(
+        ('0.0.0.0', config.get('web', {}).get('port', 7800)),
+        app,
+        handler_class=WebSocketHandler,
+        log=None
+    )
+    server.serve_forever()
 
 if __name__ == '__main__':
     main()
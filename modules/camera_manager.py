@@ -1,19 +1,56 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
+import os
 import cv2
 import time
+import numpy as np
 import logging
 import threading
-from queue import Queue
 from collections import defaultdict
 
 logger = logging.getLogger(__name__)
 
+# Low-latency RTSP options for OpenCV's FFmpeg backend: no demuxer buffering,
+# no B-frame reorder queue and TCP transport to avoid UDP packet loss.
+FFMPEG_CAPTURE_OPTIONS = (
+    "rtsp_transport;tcp|fflags;nobuffer|flags;low_delay|max_delay;0|reorder_queue_size;0"
+)
+
+# GStreamer pipeline with a zero-latency jitter buffer and a single-slot
+# appsink that drops stale frames instead of queueing them.
+GSTREAMER_PIPELINE = (
+    "rtspsrc location={url} latency=0 drop-on-latency=true ! "
+    "rtph264depay ! h264parse ! avdec_h264 discard-corrupted-frames=true ! "
+    "videoconvert ! video/x-raw,format=BGR ! "
+    "appsink max-buffers=1 drop=true sync=false"
+)
+
+# Frames are decoded into a ring of this many buffers. A frame returned by
+# get_frame() stays intact until FRAME_BUFFER_COUNT - 1 newer frames have
+# been published, so consumers can hold on to it briefly without copying.
+FRAME_BUFFER_COUNT = 3
+
+def pin_current_thread(cpu_id):
+    """Pin the calling thread to a single CPU (Linux only).
+    
+    Args:
+        cpu_id: CPU index to run on
+    """
+    if not hasattr(os, 'sched_setaffinity'):
+        return
+    try:
+        # On Linux, pid 0 targets the calling thread rather than the process
+        os.sched_setaffinity(0, {cpu_id})
+        logger.debug(f"Pinned thread to CPU {cpu_id}")
+    except OSError as e:
+        logger.warning(f"Could not pin thread to CPU {cpu_id}: {e}")
+
 class Camera:
     """Class to handle a single camera stream."""
     
-    def __init__(self, camera_id, name, rtsp_url, fps=10):
+    def __init__(self, camera_id, name, rtsp_url, fps=10, backend='ffmpeg', cpu_id=None,
+                 frame_event=None):
         """Initialize a camera instance.
         
         Args:
@@ -21,28 +58,45 @@ class Camera:
             name: Human-readable name for the camera
             rtsp_url: RTSP URL for the camera stream
             fps: Target frames per second to process
+            backend: Capture backend, either 'ffmpeg' or 'gstreamer'
+            cpu_id: CPU to pin the capture thread to, or None to not pin
+            frame_event: threading.Event to set whenever a new frame is ready
         """
         self.camera_id = camera_id
         self.name = name
         self.rtsp_url = rtsp_url
         self.fps = fps
+        self.backend = backend
+        self.cpu_id = cpu_id
+        self.frame_event = frame_event
         self.cap = None
         self.connected = False
         self.last_frame = None
         self.last_frame_time = 0
         self.frame_count = 0
         self.running = True
-        self.lock = threading.Lock()
-        self.frame_queue = Queue(maxsize=2)  # Only keep latest frames
+        self._latest = None  # Newest frame not yet taken by get_frame_from_queue
+        # Ring of frame buffers, allocated on the first frame
+        self._fb = None
+        self._fb_views = None
+        self._widx = 0
         self.connection_attempts = 0
+        self._status_key = None  # State the cached status dict was built from
+        self._status = None
         self.connect()
         
+        # The only thread that reads the stream and writes the frame ring;
+        # reconnects reopen the capture from inside it
+        self.capture_thread = threading.Thread(target=self._capture_loop)
+        self.capture_thread.daemon = True
+        self.capture_thread.start()
+        
     def connect(self):
-        """Connect to the RTSP stream."""
+        """Connect to the RTSP stream, replacing any previous capture."""
         try:
-            # OpenCV connection options for RTSP
-            self.cap = cv2.VideoCapture(self.rtsp_url, cv2.CAP_FFMPEG)
-            self.cap.set(cv2.CAP_PROP_BUFFERSIZE, 2)  # Minimize buffer to reduce latency
+            if self.cap is not None:
+                self.cap.release()
+            self.cap = self._open_capture()
             
             if not self.cap.isOpened():
                 logger.error(f"Failed to open camera stream: {self.rtsp_url}")
@@ -53,12 +107,6 @@ class Camera:
             logger.info(f"Connected to camera: {self.name} ({self.rtsp_url})")
             self.connected = True
             self.connection_attempts = 0
-            
-            # Start capture thread
-            self.capture_thread = threading.Thread(target=self._capture_loop)
-            self.capture_thread.daemon = True
-            self.capture_thread.start()
-            
             return True
         except Exception as e:
             logger.error(f"Error connecting to camera {self.name}: {e}")
@@ -66,10 +114,33 @@ class Camera:
             self.connection_attempts += 1
             return False
     
+    def _open_capture(self):
+        """Open the RTSP stream with a low-latency capture backend.
+        
+        Returns:
+            cv2.VideoCapture instance
+        """
+        if self.backend == 'gstreamer':
+            pipeline = GSTREAMER_PIPELINE.format(url=self.rtsp_url)
+            return cv2.VideoCapture(pipeline, cv2.CAP_GSTREAMER)
+        
+        # The FFmpeg backend reads its options from the environment when the
+        # capture is opened
+        os.environ['OPENCV_FFMPEG_CAPTURE_OPTIONS'] = FFMPEG_CAPTURE_OPTIONS
+        return cv2.VideoCapture(self.rtsp_url, cv2.CAP_FFMPEG)
+    
     def _capture_loop(self):
-        """Continuously capture frames from the camera stream."""
-        last_capture_time = 0
-        interval = 1.0 / self.fps  # Time interval between frame captures
+        """Continuously capture frames from the camera stream.
+        
+        cap.grab() blocks until the next frame arrives, so the loop runs at the
+        stream's native rate. Frame rate limiting is done by the consumer.
+        
+        Frames are decoded into a ring of FRAME_BUFFER_COUNT pre-allocated
+        buffers in turn: the next buffer is filled while readers see the
+        previous ones, then it is published.
+        """
+        if self.cpu_id is not None:
+            pin_current_thread(self.cpu_id)
         
         while self.running:
             if not self.connected or not self.cap.isOpened():
@@ -78,31 +149,36 @@ class Camera:
                 time.sleep(5)  # Wait before trying to reconnect
                 continue
                 
-            # Control capture rate
-            current_time = time.time()
-            if current_time - last_capture_time < interval:
-                time.sleep(0.001)  # Small sleep to prevent CPU hogging
-                continue
-                
             try:
-                ret, frame = self.cap.read()
+                back = (self._widx + 1) % FRAME_BUFFER_COUNT
+                dst = self._fb[back] if self._fb is not None else None
+                
+                ret = self.cap.grab()
+                if ret:
+                    ret, frame = self.cap.retrieve(dst)
                 if not ret or frame is None:
-                    logger.warning(f"Failed to read frame from camera {self.name}")
+                    logger.debug(f"Failed to read frame from camera {self.name}")
                     self.connected = False
                     continue
-                    
-                # Update frame
-                with self.lock:
-                    self.last_frame = frame
-                    self.last_frame_time = current_time
-                    self.frame_count += 1
-                
-                # Clear queue if full and put new frame
-                while self.frame_queue.full():
-                    self.frame_queue.get()
-                self.frame_queue.put(frame)
                 
-                last_capture_time = current_time
+                if frame is not dst:
+                    # First frame or resolution change: reallocate around it
+                    self._fb = [np.empty_like(frame) for _ in range(FRAME_BUFFER_COUNT)]
+                    self._fb[back] = frame
+                    self._fb_views = [buf.view() for buf in self._fb]
+                    for view in self._fb_views:
+                        view.flags.writeable = False
+                    
+                # Publish frame. Single attribute stores are atomic under the
+                # GIL and readers tolerate slightly stale counters, so no lock.
+                self._widx = back
+                frame = self._fb_views[back]
+                self.last_frame = frame
+                self._latest = frame
+                self.last_frame_time = time.time()
+                self.frame_count += 1
+                if self.frame_event is not None:
+                    self.frame_event.set()
             except Exception as e:
                 logger.error(f"Error capturing frame from camera {self.name}: {e}")
                 self.connected = False
@@ -114,22 +190,44 @@ class Camera:
     def get_frame(self):
         """Get the latest frame from the camera.
         
+        The frame is a read-only view of a ring buffer that is overwritten
+        after FRAME_BUFFER_COUNT - 1 newer frames; copy it if it must
+        outlive that.
+        
         Returns:
             Latest frame or None if no frame available
         """
-        with self.lock:
-            return self.last_frame
+        return self.last_frame
     
     def get_frame_from_queue(self):
-        """Get the latest frame from the queue (non-blocking).
+        """Take the newest frame not yet consumed (non-blocking).
         
         Returns:
-            Latest frame or None if queue is empty
+            Latest frame or None if no new frame has arrived
         """
-        try:
-            return self.frame_queue.get_nowait()
-        except:
-            return None
+        frame = self._latest
+        self._latest = None
+        return frame
+    
+    def get_status(self):
+        """Get the camera status, rebuilding it only when it changed.
+        
+        Frame statistics are refreshed about once per second of frames, so
+        repeated calls between updates return the same dict.
+        
+        Returns:
+            Dictionary with connection and frame statistics
+        """
+        key = (self.connected, self.connection_attempts, self.frame_count // max(self.fps, 1))
+        if key != self._status_key:
+            self._status = {
+                'connected': self.connected,
+                'frame_count': self.frame_count,
+                'last_frame_time': self.last_frame_time,
+                'connection_attempts': self.connection_attempts
+            }
+            self._status_key = key
+        return self._status
     
     def stop(self):
         """Stop the camera capture."""
@@ -142,15 +240,38 @@ class Camera:
 class CameraManager:
     """Manages multiple camera streams."""
     
-    def __init__(self, camera_configs):
+    def __init__(self, camera_configs, cpu_affinity=False):
         """Initialize the camera manager.
         
         Args:
             camera_configs: List of camera configuration dictionaries
+            cpu_affinity: Pin each camera's capture thread to its own CPU
         """
         self.cameras = {}
+        self.cpu_affinity = cpu_affinity
+        # Set by every camera on each new frame, so consumers can wait for
+        # frames instead of polling
+        self.frame_available = threading.Event()
         self.update_cameras(camera_configs)
     
+    def _camera_cpu(self, index):
+        """Pick the CPU for the camera at a given position in the config.
+        
+        CPU 0 is left for the zone detector; cameras are spread over the rest.
+        
+        Args:
+            index: Position of the camera in the configuration list
+            
+        Returns:
+            CPU index, or None if affinity is disabled
+        """
+        if not self.cpu_affinity:
+            return None
+        cpu_count = os.cpu_count() or 1
+        if cpu_count == 1:
+            return 0
+        return 1 + index % (cpu_count - 1)
+    
     def update_cameras(self, camera_configs):
         """Update camera list from configuration.
         
@@ -168,17 +289,22 @@ class CameraManager:
             del self.cameras[camera_id]
         
         # Add or update cameras
-        for config in camera_configs:
+        for index, config in enumerate(camera_configs):
             camera_id = config['id']
-            # Update existing camera if URL changed
-            if camera_id in self.cameras and self.cameras[camera_id].rtsp_url != config['rtsp_url']:
+            # Update existing camera if URL or capture backend changed
+            existing = self.cameras.get(camera_id)
+            if existing is not None and (existing.rtsp_url != config['rtsp_url'] or
+                                         existing.backend != config.get('backend', 'ffmpeg')):
                 logger.info(f"Updating camera {camera_id}")
                 self.cameras[camera_id].stop()
                 self.cameras[camera_id] = Camera(
                     camera_id,
                     config['name'],
                     config['rtsp_url'],
-                    config.get('fps', 10)
+                    config.get('fps', 10),
+                    config.get('backend', 'ffmpeg'),
+                    self._camera_cpu(index),
+                    self.frame_available
                 )
             # Add new camera
             elif camera_id not in self.cameras:
@@ -187,7 +313,10 @@ class CameraManager:
                     camera_id,
                     config['name'],
                     config['rtsp_url'],
-                    config.get('fps', 10)
+                    config.get('fps', 10),
+                    config.get('backend', 'ffmpeg'),
+                    self._camera_cpu(index),
+                    self.frame_available
                 )
     
     def get_camera(self, camera_id):
@@ -223,6 +352,7 @@ class CameraManager:
                 'rtsp_url': camera.rtsp_url,
                 'connected': camera.connected,
                 'fps': camera.fps,
+                'backend': camera.backend,
                 'frame_count': camera.frame_count
             })
         return camera_info
@@ -233,15 +363,7 @@ class CameraManager:
         Returns:
             Dictionary with camera statuses
         """
-        status = {}
-        for camera_id, camera in self.cameras.items():
-            status[camera_id] = {
-                'connected': camera.connected,
-                'frame_count': camera.frame_count,
-                'last_frame_time': camera.last_frame_time,
-                'connection_attempts': camera.connection_attempts
-            }
-        return status
+        return {camera_id: camera.get_status() for camera_id, camera in self.cameras.items()}
     
     def stop_all(self):
         """Stop all camera captures."""
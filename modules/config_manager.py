@@ -5,8 +5,26 @@ import os
 import json
 import logging
 
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
 logger = logging.getLogger(__name__)
 
+def _dumps(data):
+    """Serialize configuration data to indented JSON bytes."""
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(data, option=orjson.OPT_INDENT_2)
+    return json.dumps(data, indent=2).encode('utf-8')
+
+def _loads(raw):
+    """Parse JSON bytes into configuration data."""
+    if ORJSON_AVAILABLE:
+        return orjson.loads(raw)
+    return json.loads(raw)
+
 class ConfigManager:
     """Manages configuration for the AMS Zone Monitor application."""
     
@@ -17,14 +35,17 @@ class ConfigManager:
             config_path: Path to the JSON configuration file
         """
         self.config_path = config_path
+        self._saved_bytes = None  # Last serialized config written to disk
         self.config = self._load_config()
         
     def _load_config(self):
         """Load configuration from the JSON file or create default if not exists."""
         if os.path.exists(self.config_path):
             try:
-                with open(self.config_path, 'r') as f:
-                    return json.load(f)
+                with open(self.config_path, 'rb') as f:
+                    raw = f.read()
+                self._saved_bytes = raw
+                return _loads(raw)
             except Exception as e:
                 logger.error(f"Error loading configuration: {e}")
                 return self._create_default_config()
@@ -44,10 +65,26 @@ class ConfigManager:
             'hailo': {
                 'model_path': '/opt/hailo/models/yolov5s_persondetection.hef',
                 'confidence_threshold': 0.5,
+                'batch_size': None,  # Frames per inference; taken from the model when None
+            },
+            'motion': {
+                'enabled': True,  # Skip inference on frames without changes
+                'threshold': 2.0,  # Mean absolute difference of 192x108 grayscale thumbnails
+                'max_skipped_frames': 10,  # Always infer after this many skipped frames
+            },
+            'debounce': {
+                'on_frames': 1,  # Consecutive detections before a zone is occupied
+                'off_frames': 3,  # Consecutive misses before a zone is clear
+                'hold': 0.0,  # Minimum seconds a zone stays occupied after a detection
             },
             'web': {
                 'port': 5000,
                 'debug': False,
+            },
+            'system': {
+                'cpu_affinity': False,  # Pin capture and detector threads to CPUs
+                'opencv_threads': None,  # Worker threads per OpenCV call (-1 = OpenCV default); chosen from the camera count when None
+                'target_fps': 20,  # Rate of the detector's capture loop
             }
         }
         
@@ -55,8 +92,7 @@ class ConfigManager:
         os.makedirs(os.path.dirname(self.config_path), exist_ok=True)
         
         # Save default config
-        with open(self.config_path, 'w') as f:
-            json.dump(default_config, f, indent=4)
+        self._write_atomic(_dumps(default_config))
         
         logger.info(f"Created default configuration at {self.config_path}")
         return default_config
@@ -85,10 +121,26 @@ class ConfigManager:
         self._save_config()
         
     def _save_config(self):
-        """Save the current configuration to the JSON file."""
+        """Save the current configuration to the JSON file.
+        
+        Skips the write when the serialized config matches the file.
+        """
         try:
-            with open(self.config_path, 'w') as f:
-                json.dump(self.config, f, indent=4)
-            logger.info(f"Configuration saved to {self.config_path}")
+            data = _dumps(self.config)
+            if data != self._saved_bytes:
+                self._write_atomic(data)
+                logger.info(f"Configuration saved to {self.config_path}")
         except Exception as e:
             logger.error(f"Error saving configuration: {e}")
+    
+    def _write_atomic(self, data):
+        """Write bytes to the config file via a temporary file and rename.
+        
+        Args:
+            data: Serialized configuration
+        """
+        tmp_path = self.config_path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, self.config_path)
+        self._saved_bytes = data
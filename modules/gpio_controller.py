@@ -1,9 +1,8 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
-import time
 import logging
-from threading import Lock
+from threading import Lock, Timer
 
 try:
     import RPi.GPIO as GPIO
@@ -29,7 +28,8 @@ class GPIOController:
         self.activation_delay = gpio_config.get('activation_delay', 0.5)
         
         self.is_active = False
-        self.last_deactivation_time = 0
+        self._deactivation_timer = None
+        self._deactivation_id = 0  # Identifies the current deactivation timer
         self.lock = Lock()
         
         # Initialize GPIO if available
@@ -81,8 +81,17 @@ class GPIOController:
             logger.info(f"GPIO configuration updated: {gpio_config}")
     
     def activate(self):
-        """Activate the GPIO pin (for relay control)."""
+        """Activate the GPIO pin (for relay control).
+        
+        Cancels any pending delayed deactivation. The state is only read
+        under the lock, since a deactivation timer firing concurrently
+        changes it in two steps.
+        """
         with self.lock:
+            if self._deactivation_timer is not None:
+                self._deactivation_timer.cancel()
+                self._deactivation_timer = None
+            
             if not self.is_active:
                 if GPIO_AVAILABLE:
                     active_state = GPIO.HIGH if self.active_high else GPIO.LOW
@@ -91,11 +100,29 @@ class GPIOController:
                 logger.info(f"GPIO pin {self.output_pin} activated")
     
     def deactivate(self):
-        """Deactivate the GPIO pin (for relay control)."""
+        """Deactivate the GPIO pin (for relay control).
+        
+        The pin is released after activation_delay seconds unless activate()
+        is called again in the meantime.
+        """
         with self.lock:
-            # Only deactivate if enough time has passed since last deactivation
-            current_time = time.time()
-            if current_time - self.last_deactivation_time < self.activation_delay:
+            if not self.is_active or self._deactivation_timer is not None:
+                return
+            self._deactivation_id += 1
+            self._deactivation_timer = Timer(self.activation_delay, self._deactivate_now,
+                                             args=(self._deactivation_id,))
+            self._deactivation_timer.daemon = True
+            self._deactivation_timer.start()
+    
+    def _deactivate_now(self, deactivation_id):
+        """Drive the pin inactive once the deactivation delay has elapsed.
+        
+        Args:
+            deactivation_id: ID of the timer that fired
+        """
+        with self.lock:
+            # activate() may have cancelled this timer after it fired
+            if self._deactivation_timer is None or deactivation_id != self._deactivation_id:
                 return
             
             if self.is_active:
@@ -103,8 +130,8 @@ class GPIOController:
                     inactive_state = GPIO.LOW if self.active_high else GPIO.HIGH
                     GPIO.output(self.output_pin, inactive_state)
                 self.is_active = False
-                self.last_deactivation_time = current_time
                 logger.info(f"GPIO pin {self.output_pin} deactivated")
+            self._deactivation_timer = None
     
     def is_activated(self):
         """Check if the GPIO pin is currently activated.
@@ -137,6 +164,11 @@ class GPIOController:
     
     def cleanup(self):
         """Clean up GPIO resources."""
+        with self.lock:
+            if self._deactivation_timer is not None:
+                self._deactivation_timer.cancel()
+                self._deactivation_timer = None
+        
         if GPIO_AVAILABLE:
             try:
                 # Set pin to inactive state before cleanup
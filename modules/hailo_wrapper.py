@@ -2,8 +2,12 @@ import os
 import sys
 import logging
 import importlib.util
+from collections import deque
+import cv2
 import numpy as np
 
+from modules import kernels
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 
@@ -30,9 +34,31 @@ except ImportError:
         logging.error("Hailo SDK could not be imported. Detection will be simulated.")
         HAILO_AVAILABLE = False
 
+NMS_IOU_THRESHOLD = 0.45
+
+# Nearest-neighbour is the cheapest camera-to-model downscale; person-sized
+# objects survive the aliasing, and preprocessing is memory-bound on the Pi
+RESIZE_INTERPOLATION = cv2.INTER_NEAREST
+
+def _nms_opencv(boxes, scores, iou_thr):
+    """Greedy non-maximum suppression using cv2.dnn.NMSBoxes.
+    
+    Used when Numba is not available. Same arguments and return value as
+    _nms_kernel in kernels.
+    """
+    # NMSBoxes takes [x, y, w, h] boxes
+    rects = boxes.copy()
+    rects[:, 2:] -= rects[:, :2]
+    keep = cv2.dnn.NMSBoxes(rects, scores, 0.0, float(iou_thr))
+    return np.asarray(keep, dtype=np.int32).reshape(-1)
+
+# Compiled kernel when Numba is available, OpenCV otherwise
+_nms = kernels.nms or _nms_opencv
+
 class HailoWrapper:
-    def __init__(self, model_path):
+    def __init__(self, model_path, batch_size=None):
         self.model_path = model_path
+        self.batch_size = 1  # Taken from the model once it is loaded
         self.device = None
         self.network = None
         self.input_vstream = None
@@ -40,6 +66,14 @@ class HailoWrapper:
         self.initialized = False
         self.input_shape = None
         self.output_shape = None
+        self._dtype = np.uint8
+        self._output_dtype = np.float32
+        self._output_quant = None  # (scale, zero_point) for quantized outputs
+        self.detection_output_name = None  # Output holding [batch, boxes, 5 + classes] rows
+        
+        # Pre-allocated preprocessing buffers, sized once the input shape is known
+        self._free_batches = deque()  # Batch tensors handed back by release_batch
+        self._allocate_buffers(640, 640)
         
         if not HAILO_AVAILABLE:
             logging.error("Hailo SDK not available. Cannot initialize Hailo device.")
@@ -72,6 +106,37 @@ class HailoWrapper:
             logging.info(f"Model input shape: {self.input_shape}")
             logging.info(f"Model output shape: {self.output_shape}")
             
+            # The HEF is compiled for a fixed batch; every write must match it
+            self.batch_size = self._resolve_batch_size(batch_size)
+            logging.info(f"Model batch size: {self.batch_size}")
+            
+            # The output layout is fixed by the HEF, so check once whether it
+            # is a YOLO detection tensor instead of on every frame
+            if len(self.output_shape) == 3 and self.output_shape[2] > 5:
+                self.detection_output_name = 'output'
+            else:
+                logging.warning(f"Model output {self.output_shape} is not a [batch, boxes, 5 + classes] detection tensor")
+            
+            # Quantized HEFs take uint8 NHWC input and normalize on-chip
+            self._dtype = self._get_input_dtype(input_tensors[0])
+            logging.info(f"Model input dtype: {np.dtype(self._dtype).name}")
+            
+            # Quantized outputs are dequantized on the host
+            self._output_dtype = self._get_output_dtype(output_tensors[0])
+            self._output_quant = self._get_quant_info(output_tensors[0])
+            logging.info(f"Model output dtype: {np.dtype(self._output_dtype).name}")
+            if self._output_quant is None and np.dtype(self._output_dtype).kind in 'iu':
+                # Raw integer codes read as floats pass any confidence threshold
+                logging.error(f"Model output is {np.dtype(self._output_dtype).name} without "
+                              f"quantization info; cannot dequantize detections")
+                self.cleanup()
+                return
+            
+            if len(self.input_shape) >= 3:
+                # [batch,] height, width, channels; see _resolve_batch_size
+                height, width = self.input_shape[-3:-1]
+                self._allocate_buffers(height, width)
+            
             # Setup input and output virtual streams
             self.input_vstream = self.network.create_input_vstream()
             self.output_vstream = self.network.create_output_vstream()
@@ -82,103 +147,233 @@ class HailoWrapper:
             logging.error(f"Error initializing Hailo device: {e}")
             self.cleanup()
     
-    def infer(self, image):
+    def send(self, input_tensor):
+        """Write a preprocessed tensor to the device without waiting for its output.
+        
+        Each successful send() must be matched by one recv(), in order.
+        
+        Returns:
+            True if the tensor was written
+        """
         if not self.initialized:
             logging.error("Hailo device not initialized. Cannot perform inference.")
-            return None
-            
+            return False
+        
         try:
-            # Preprocess image
-            preprocessed_image = self.preprocess_image(image)
-            
-            # Write input data to device
-            self.input_vstream.write(preprocessed_image)
-            
-            # Read output data from device
-            output_data = self.output_vstream.read()
-            
-            # Post-process output data
-            results = self.postprocess_output(output_data)
-            
-            return results
+            self.input_vstream.write(input_tensor)
+            return True
         except Exception as e:
-            logging.error(f"Error during Hailo inference: {e}")
-            return None
+            logging.error(f"Error writing frame to Hailo device: {e}")
+            return False
     
-    def preprocess_image(self, image):
-        """Preprocess the image for Hailo inference"""
+    def recv(self):
+        """Read the output of the oldest tensor passed to send().
+        
+        Returns:
+            Dictionary of output arrays by output name, or None on failure
+        """
         try:
-            # Resize image to match model input shape
-            if self.input_shape and len(self.input_shape) >= 3:
-                height, width = self.input_shape[1], self.input_shape[2]
-                resized_image = cv2.resize(image, (width, height))
-            else:
-                # Default to 640x640 for YOLO models if shape is not available
-                resized_image = cv2.resize(image, (640, 640))
-            
-            # Convert to RGB if needed
-            if len(resized_image.shape) == 3 and resized_image.shape[2] == 3:
-                # Already RGB, do nothing
-                pass
-            else:
-                resized_image = cv2.cvtColor(resized_image, cv2.COLOR_BGR2RGB)
+            return {'output': self._as_array(self.output_vstream.read())}
+        except Exception as e:
+            logging.error(f"Error reading output from Hailo device: {e}")
+            return None
+    
+    def _resolve_batch_size(self, requested):
+        """Determine the batch size from the model input shape
+        
+        A configured batch size is only an override for models whose input
+        shape has no batch dimension; otherwise it must match the model's.
+        
+        Args:
+            requested: Configured batch size, or None
             
-            # Normalize pixel values to [0,1]
-            normalized_image = resized_image.astype(np.float32) / 255.0
+        Returns:
+            Number of frames per device write
+        """
+        if requested is not None:
+            try:
+                requested = int(requested)
+            except (TypeError, ValueError):
+                requested = 0
+            if requested < 1:
+                logging.warning("Ignoring invalid Hailo batch_size in the configuration")
+                requested = None
+        
+        if len(self.input_shape) == 4 and self.input_shape[0] > 0:
+            model_batch = int(self.input_shape[0])
+            if requested is not None and requested != model_batch:
+                logging.warning(f"Configured batch size {requested} does not match the model's "
+                                f"{model_batch}; using {model_batch}")
+            return model_batch
+        return requested or 1
+    
+    @staticmethod
+    def _get_input_dtype(input_tensor):
+        """Determine whether the model input is uint8, float16 or float32"""
+        fmt = getattr(input_tensor, 'format', None)
+        fmt_type = str(getattr(fmt, 'type', getattr(input_tensor, 'dtype', ''))).lower()
+        if 'float16' in fmt_type or 'fp16' in fmt_type:
+            return np.float16
+        if 'float' in fmt_type:
+            return np.float32
+        return np.uint8
+    
+    @staticmethod
+    def _get_output_dtype(output_tensor):
+        """Determine the output dtype; float32 unless the tensor says it is quantized"""
+        fmt = getattr(output_tensor, 'format', None)
+        fmt_type = str(getattr(fmt, 'type', getattr(output_tensor, 'dtype', ''))).lower()
+        if 'uint16' in fmt_type:
+            return np.uint16
+        if 'uint8' in fmt_type:
+            return np.uint8
+        if 'float16' in fmt_type or 'fp16' in fmt_type:
+            return np.float16
+        return np.float32
+    
+    @staticmethod
+    def _get_quant_info(tensor):
+        """Get the (scale, zero_point) of a quantized tensor, or None if unknown"""
+        quant_info = getattr(tensor, 'quant_info', None)
+        scale = getattr(quant_info, 'qp_scale', None)
+        zero_point = getattr(quant_info, 'qp_zp', None)
+        if scale is None or zero_point is None:
+            return None
+        return np.float32(scale), np.float32(zero_point)
+    
+    def _allocate_buffers(self, height, width):
+        """Allocate the reusable preprocessing buffers for a given input size"""
+        self._input_size = (width, height)
+        self._resized = np.empty((height, width, 3), dtype=np.uint8)
+        self._rgb = np.empty((height, width, 3), dtype=np.uint8)
+        self._slot_shape = (height, width, 3)  # One HWC image of a batch tensor
+        self._preprocess_into = self._make_preprocessor(height, width, self._dtype)
+    
+    def preprocess_batch(self, images):
+        """Preprocess several images into an NHWC batch tensor
+        
+        The returned tensor is not shared with the next call, so it can be
+        queued while the next batch is prepared. Tensors handed back with
+        release_batch are reused. The HEF is
+        compiled for a fixed batch size, so fewer images than batch_size
+        are padded with blank frames whose outputs the caller ignores.
+        
+        Args:
+            images: List of at most batch_size BGR frames
             
-            # Transpose to model expected format [N,C,H,W]
-            input_tensor = np.transpose(normalized_image, (2, 0, 1))
+        Returns:
+            Tensor of shape [batch_size, H, W, 3] in the model's input dtype
+        """
+        n = len(images)
+        shape = (max(n, self.batch_size),) + self._slot_shape
+        try:
+            batch = self._free_batches.pop()
+        except IndexError:
+            batch = None
+        if batch is None or batch.shape != shape or batch.dtype != self._dtype:
+            # First batches, or the input size changed since it was released
+            batch = np.empty(shape, dtype=self._dtype)
+        for i, image in enumerate(images):
+            self._preprocess_into(image, batch[i])
+        batch[n:] = 0
+        return batch
+    
+    def release_batch(self, batch):
+        """Hand a tensor from preprocess_batch back for reuse
+        
+        Call this once the tensor has been written to the device and is no
+        longer referenced.
+        """
+        self._free_batches.append(batch)
+    
+    def _make_preprocessor(self, height, width, dtype):
+        """Build a preprocessing function specialized for the model input
+        
+        The input size, dtype and scratch buffers are fixed once the model is
+        loaded, so they are bound into a closure instead of being looked up
+        and branched on for every frame.
+        
+        Returns:
+            Function (image, dst) that resizes and color-converts an image
+            into one HWC slot of an input tensor
+        """
+        size = (width, height)
+        resized = self._resized
+        rgb = self._rgb
+        resize = cv2.resize
+        interpolation = RESIZE_INTERPOLATION
+        cvt_color = cv2.cvtColor
+        bgr2rgb = cv2.COLOR_BGR2RGB
+        
+        if dtype == np.uint8:
+            # Normalization happens on the device
+            def preprocess_into(image, dst):
+                resize(image, size, dst=resized, interpolation=interpolation)
+                cvt_color(resized, bgr2rgb, dst=dst)
+        else:
+            # Float models (FP16 or FP32) need [0,1] input. The scale writes
+            # straight into the tensor slot, so nothing is allocated per
+            # frame. np.multiply is used rather than cv2.multiply(...,
+            # dtype=cv2.CV_32F), which measured about 2x slower here, and it
+            # also handles FP16 outputs. The layout stays NHWC, which is what
+            # the Hailo input vstreams take.
+            scale = dtype(1.0 / 255.0)
+            multiply = np.multiply
             
-            # Add batch dimension
-            input_tensor = np.expand_dims(input_tensor, axis=0)
+            def preprocess_into(image, dst):
+                resize(image, size, dst=resized, interpolation=interpolation)
+                cvt_color(resized, bgr2rgb, dst=rgb)
+                multiply(rgb, scale, out=dst, casting='unsafe')
+        
+        return preprocess_into
+    
+    def _as_array(self, output_data):
+        """Wrap raw vstream output as an ndarray without copying
+        
+        Quantized outputs stay in their integer dtype; detection_rows
+        dequantizes only the rows that survive the objectness threshold.
+        
+        Args:
+            output_data: ndarray, array-like, or raw bytes in the output dtype
             
-            return input_tensor
-        except Exception as e:
-            logging.error(f"Error preprocessing image: {e}")
-            return image
+        Returns:
+            ndarray of shape [batch, ...] for raw bytes, else the input as an array
+        """
+        if isinstance(output_data, (bytes, bytearray, memoryview)):
+            return np.frombuffer(output_data, dtype=self._output_dtype).reshape(-1, *self.output_shape[1:])
+        return np.asarray(output_data)
     
-    def postprocess_output(self, output_data):
-        """Process the raw output from Hailo to bounding boxes"""
-        try:
-            # This is a simplified implementation
-            # Actual implementation depends on the specific model format
-            
-            # Convert output to numpy array if it's not already
-            if not isinstance(output_data, np.ndarray):
-                output_data = np.array(output_data)
-            
-            # For YOLO models, the output is typically:
-            # [batch, num_boxes, 5+num_classes] where 5 is [x, y, w, h, confidence]
-            
-            # Filter out low confidence detections
-            confidence_threshold = 0.5
-            detections = []
-            
-            # This is a simplified example - adapt based on your model's output format
-            if len(output_data.shape) == 3 and output_data.shape[2] > 5:
-                for box in output_data[0]:  # Process first batch
-                    confidence = box[4]
-                    if confidence > confidence_threshold:
-                        # Get class with highest probability
-                        class_id = np.argmax(box[5:])
-                        class_confidence = box[5 + class_id]
-                        
-                        # Only keep person class (usually class 0)
-                        if class_id == 0:  # Assuming 0 is person class
-                            x, y, w, h = box[0:4]
-                            
-                            # Convert to [x1, y1, x2, y2, confidence, class_id]
-                            x1 = int(x - w/2)
-                            y1 = int(y - h/2)
-                            x2 = int(x + w/2)
-                            y2 = int(y + h/2)
-                            
-                            detections.append([x1, y1, x2, y2, confidence, class_id])
-            
-            return detections
-        except Exception as e:
-            logging.error(f"Error postprocessing output: {e}")
-            return []
+    def detection_rows(self, output, conf_thr):
+        """Select the confident rows of a [batch, boxes, 5 + classes] output
+        
+        Objectness is thresholded before anything is converted, in the
+        quantized domain for uint8/uint16 outputs, so only the surviving
+        rows are dequantized to float32.
+        
+        Args:
+            output: Detection output as returned by recv()
+            conf_thr: Minimum objectness
+            
+        Returns:
+            List with one float32 [N, 5 + classes] array per batch entry
+        """
+        if output.dtype.kind in 'iu':
+            # Initialization refuses integer outputs without quantization info
+            scale, zero_point = self._output_quant
+            # objectness >= conf_thr  <=>  q >= conf_thr / scale + zero_point;
+            # the margin keeps rows lost to rounding, the decoder rechecks them
+            q_thr = conf_thr / scale + zero_point - 1e-3
+            rows = []
+            for frame_output in output:
+                selected = frame_output[frame_output[:, 4] >= q_thr]
+                dequantized = np.subtract(selected, zero_point, dtype=np.float32)
+                dequantized *= scale
+                rows.append(dequantized)
+            return rows
+        return [
+            np.ascontiguousarray(frame_output[frame_output[:, 4] >= conf_thr], dtype=np.float32)
+            for frame_output in output
+        ]
     
     def cleanup(self):
         """Release Hailo resources"""
@@ -206,3 +401,20 @@ class HailoWrapper:
 def is_hailo_available():
     """Check if Hailo SDK is available"""
     return HAILO_AVAILABLE
+
+def non_max_suppression(boxes, scores, iou_thr=NMS_IOU_THRESHOLD):
+    """Greedy non-maximum suppression
+    
+    Uses the Numba kernel when available, otherwise cv2.dnn.NMSBoxes.
+    
+    Args:
+        boxes: Array of shape [N, 4] as [x1, y1, x2, y2]
+        scores: Array of shape [N]
+        iou_thr: IoU above which the lower-scoring box is suppressed
+        
+    Returns:
+        int32 array of kept indices, highest score first
+    """
+    return _nms(np.ascontiguousarray(boxes, dtype=np.float32),
+                np.ascontiguousarray(scores, dtype=np.float32),
+                np.float32(iou_thr))
@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Numba-compiled kernels for the per-frame detection and zone tests.
+
+Numba is optional. Without it every compiled kernel below is None, and
+callers use their NumPy or OpenCV implementations instead.
+"""
+
+import logging
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+    logger.warning("Numba not available. Detection and zone tests will use the NumPy and OpenCV implementations.")
+
+def _person_score(det, i):
+    """Class score of a raw YOLOv5 row if its best class is a person.
+    
+    Same result as an argmax over the class scores followed by a check for
+    class 0 (person in COCO), but stops at the first class that beats it.
+    
+    Args:
+        det: Raw detection rows of shape [N, 5 + classes]
+        i: Index of the row
+    
+    Returns:
+        The person class score, or -1.0 if another class scores higher
+    """
+    score = det[i, 5]
+    for c in range(6, det.shape[1]):
+        if det[i, c] > score:
+            return np.float32(-1.0)
+    return score
+
+def _point_in_polygon(x, y, vx, vy, vx_next, vy_next):
+    """Even-odd ray cast of one point against a polygon.
+    
+    Same rule as _points_in_polygon_numpy in zone_detector.
+    
+    Args:
+        x, y: Point coordinates
+        vx, vy, vx_next, vy_next: Polygon edge arrays from _polygon_edges
+    
+    Returns:
+        True if the point is inside the polygon
+    """
+    inside = False
+    for e in range(vx.shape[0]):
+        y0 = vy[e]
+        y1 = vy_next[e]
+        if (y0 <= y) != (y1 <= y):
+            side = (x - vx[e]) * (y1 - y0) - (vx_next[e] - vx[e]) * (y - y0)
+            if (side > 0 and y1 > y0) or (side < 0 and y1 < y0):
+                inside = not inside
+    return inside
+
+def _points_in_polygon_kernel(px, py, vx, vy, vx_next, vy_next):
+    """Even-odd ray cast of many points against one polygon.
+    
+    Edges are the outer loop and points the inner one, and the inner body
+    has no branches, so LLVM can vectorize it across points (NEON on the
+    Pi, AVX2 on x86). Same arguments and return value as
+    _points_in_polygon_numpy in zone_detector.
+    """
+    n = px.shape[0]
+    inside = np.zeros(n, dtype=np.bool_)
+    for e in range(vx.shape[0]):
+        x0 = vx[e]
+        y0 = vy[e]
+        dx = vx_next[e] - x0
+        dy = vy_next[e] - y0
+        y1 = vy_next[e]
+        upward = dy > 0
+        for i in range(n):
+            crosses = (y0 <= py[i]) != (y1 <= py[i])
+            side = (px[i] - x0) * dy - dx * (py[i] - y0)
+            inside[i] ^= crosses & (side != 0) & ((side > 0) == upward)
+    return inside
+
+def _any_point_in_polygon_kernel(px, py, vx, vy, vx_next, vy_next, xmin, ymin, xmax, ymax):
+    """Bounding box reject, then the vectorizable ray cast on the survivors.
+    
+    Same arguments and return value as _any_point_in_polygon_numpy in
+    zone_detector.
+    """
+    # Points outside the polygon's bounding box cannot be inside it; the
+    # rest are packed together for _points_in_polygon_kernel
+    n = px.shape[0]
+    bx = np.empty(n, dtype=px.dtype)
+    by = np.empty(n, dtype=py.dtype)
+    count = 0
+    for i in range(n):
+        x = px[i]
+        y = py[i]
+        if x < xmin or x > xmax or y < ymin or y > ymax:
+            continue
+        bx[count] = x
+        by[count] = y
+        count += 1
+    if count == 0:
+        return False
+    
+    inside = _points_in_polygon_kernel(bx[:count], by[:count], vx, vy, vx_next, vy_next)
+    for i in range(count):
+        if inside[i]:
+            return True
+    return False
+
+def _decode_yolov5_kernel(det, conf_thr):
+    """Decode raw YOLOv5 rows in one loop.
+    
+    Same arguments and return value as _decode_yolov5_numpy in
+    zone_detector, without the intermediate masks and arrays.
+    """
+    out = np.empty((det.shape[0], 6), dtype=np.float32)
+    count = 0
+    for i in range(det.shape[0]):
+        objectness = det[i, 4]
+        if objectness < conf_thr:
+            continue
+        
+        score = _person_score(det, i)
+        if score < conf_thr:
+            continue
+        
+        half_w = det[i, 2] * np.float32(0.5)
+        half_h = det[i, 3] * np.float32(0.5)
+        out[count, 0] = det[i, 0] - half_w
+        out[count, 1] = det[i, 1] - half_h
+        out[count, 2] = det[i, 0] + half_w
+        out[count, 3] = det[i, 1] + half_h
+        out[count, 4] = objectness * score
+        out[count, 5] = 0.0
+        count += 1
+    return out[:count]
+
+def _yolo_in_polygon_kernel(det, vx, vy, vx_next, vy_next, xmin, ymin, xmax, ymax,
+                            width, height, conf_thr, min_confidence):
+    """Test raw YOLOv5 rows for a confident person standing in a zone.
+    
+    Fuses what decoding and ZoneDetector._process_detections do with
+    arrays (confidence filter, box decode, scaling, feet point, class
+    argmax and polygon ray cast) into one loop. Each step is a filter, so
+    the cheapest rejects run first.
+    
+    Args:
+        det: Raw detection rows of shape [N, 5 + classes] as
+            [x, y, w, h, objectness, class scores...], normalized
+        vx, vy, vx_next, vy_next: Polygon edge arrays from _polygon_edges
+        xmin, ymin, xmax, ymax: Polygon bounding box in pixels
+        width, height: Frame size in pixels
+        conf_thr: Minimum objectness and class confidence
+        min_confidence: Minimum combined confidence for the zone
+    
+    Returns:
+        True on the first person whose feet are inside the polygon
+    """
+    for i in range(det.shape[0]):
+        objectness = det[i, 4]
+        if objectness < conf_thr:
+            continue
+        
+        # Bottom center point (person's feet) in pixels. Boxes outside the
+        # zone's bounding box are rejected here, before the class scan,
+        # which is the costly part of a row.
+        half_w = det[i, 2] * 0.5
+        x1 = int((det[i, 0] - half_w) * width)
+        x2 = int((det[i, 0] + half_w) * width)
+        fx = (x1 + x2) // 2
+        fy = int((det[i, 1] + det[i, 3] * 0.5) * height)
+        if fx < xmin or fx > xmax or fy < ymin or fy > ymax:
+            continue
+        
+        score = _person_score(det, i)
+        if score < conf_thr or objectness * score < min_confidence:
+            continue
+        
+        if _point_in_polygon(fx, fy, vx, vy, vx_next, vy_next):
+            return True
+    return False
+
+def _nms_kernel(boxes, scores, iou_thr):
+    """Greedy non-maximum suppression as explicit loops.
+    
+    Args:
+        boxes: float32 array of shape [N, 4] as [x1, y1, x2, y2]
+        scores: float32 array of shape [N]
+        iou_thr: IoU above which the lower-scoring box is suppressed
+    
+    Returns:
+        int32 array of kept indices, highest score first
+    """
+    n = boxes.shape[0]
+    areas = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+    order = np.argsort(-scores)
+    suppressed = np.zeros(n, dtype=np.bool_)
+    keep = np.empty(n, dtype=np.int32)
+    count = 0
+    for a in range(n):
+        i = order[a]
+        if suppressed[i]:
+            continue
+        keep[count] = i
+        count += 1
+        for b in range(a + 1, n):
+            j = order[b]
+            if suppressed[j]:
+                continue
+            w = min(boxes[i, 2], boxes[j, 2]) - max(boxes[i, 0], boxes[j, 0])
+            h = min(boxes[i, 3], boxes[j, 3]) - max(boxes[i, 1], boxes[j, 1])
+            if w <= 0 or h <= 0:
+                continue
+            inter = w * h
+            if inter / (areas[i] + areas[j] - inter + 1e-9) > iou_thr:
+                suppressed[j] = True
+    return keep[:count]
+
+if NUMBA_AVAILABLE:
+    # The kernels look the helpers up as globals when they are compiled,
+    # so the helpers are rebound to their compiled versions first
+    _jit = njit(cache=True, fastmath=True, boundscheck=False)
+    _person_score = _jit(_person_score)
+    _point_in_polygon = _jit(_point_in_polygon)
+    _points_in_polygon_kernel = _jit(_points_in_polygon_kernel)
+    any_point_in_polygon = _jit(_any_point_in_polygon_kernel)
+    decode_yolov5 = _jit(_decode_yolov5_kernel)
+    yolo_in_polygon = _jit(_yolo_in_polygon_kernel)
+    nms = _jit(_nms_kernel)
+    
+    # Compile at import so the JIT cost is not paid on the first frame
+    _edges = (np.array([0.0, 1.0, 1.0]), np.array([0.0, 0.0, 1.0]),
+              np.array([1.0, 1.0, 0.0]), np.array([0.0, 1.0, 0.0]))
+    any_point_in_polygon(np.zeros(1), np.zeros(1), *_edges, 0.0, 0.0, 1.0, 1.0)
+    decode_yolov5(np.zeros((1, 85), np.float32), 0.5)
+    yolo_in_polygon(np.zeros((1, 85), np.float32), *_edges, 0, 0, 1, 1, 1.0, 1.0, 0.5, 0.5)
+    nms(np.zeros((1, 4), np.float32), np.zeros(1, np.float32), np.float32(0.45))
+else:
+    any_point_in_polygon = None
+    decode_yolov5 = None
+    yolo_in_polygon = None
+    nms = None
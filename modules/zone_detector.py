@@ -6,15 +6,191 @@ import time
 import logging
 import numpy as np
 import threading
+import queue
 import os
-from collections import defaultdict
-from datetime import datetime
+import types
+from collections import deque
 
 # Import our improved Hailo wrapper
-from modules.hailo_wrapper import HailoWrapper, is_hailo_available
+from modules.camera_manager import pin_current_thread
+from modules.hailo_wrapper import HailoWrapper, is_hailo_available, non_max_suppression
+from modules import kernels
 
 logger = logging.getLogger(__name__)
 
+# Depth of each queue between pipeline stages in run()
+PIPELINE_QUEUE_SIZE = 2
+
+# Relay states waiting for the GPIO worker in run()
+GPIO_QUEUE_SIZE = 8
+
+# Seconds between debug logs of pipeline queue depths, dropped batches and
+# stage timings
+PIPELINE_STATS_INTERVAL = 10.0
+
+# Default rate of the capture loop (config 'system.target_fps')
+DEFAULT_TARGET_FPS = 20
+
+# Change gate defaults (config 'motion' section): frames whose downscaled
+# grayscale thumbnail differs from the last inferred one by less than
+# MOTION_THRESHOLD (mean absolute difference) are skipped, but never more
+# than MOTION_MAX_SKIPPED_FRAMES in a row
+MOTION_THUMBNAIL_SIZE = (192, 108)
+MOTION_THRESHOLD = 2.0
+MOTION_MAX_SKIPPED_FRAMES = 10
+
+# Debounce defaults (config 'debounce' section): a zone becomes occupied
+# after DEBOUNCE_ON_FRAMES consecutive positive results and clear after
+# DEBOUNCE_OFF_FRAMES consecutive negative ones, no sooner than
+# DEBOUNCE_HOLD seconds after the last positive result
+DEBOUNCE_ON_FRAMES = 1
+DEBOUNCE_OFF_FRAMES = 3
+DEBOUNCE_HOLD = 0.0
+
+# Detections are (N, 6) float32 arrays of [x1, y1, x2, y2, confidence, class_id]
+NO_DETECTIONS = np.empty((0, 6), dtype=np.float32)
+NO_DETECTIONS.flags.writeable = False
+
+def _polygon_edges(coordinates):
+    """Precompute polygon edge arrays for the vectorized point-in-polygon test.
+    
+    Args:
+        coordinates: List of [x, y] polygon vertices
+        
+    Returns:
+        Tuple (vx, vy, vx_next, vy_next) of contiguous float64 arrays
+    """
+    vertices = np.asarray(coordinates, dtype=np.float64).reshape(-1, 2)
+    # Separate contiguous x and y arrays, not strided views of the [x, y]
+    # pairs, so the compiled kernels can load several vertices per vector
+    vx = np.ascontiguousarray(vertices[:, 0])
+    vy = np.ascontiguousarray(vertices[:, 1])
+    return vx, vy, np.roll(vx, -1), np.roll(vy, -1)
+
+def _zone_geometry(coordinates):
+    """Precompute everything the per-frame code needs about a zone polygon.
+    
+    Args:
+        coordinates: List of [x, y] polygon vertices
+        
+    Returns:
+        Dictionary with the OpenCV polygon ('poly'), ray-cast edge arrays
+        ('edges') and axis-aligned bounding box ('xmin', 'ymin', 'xmax', 'ymax')
+    """
+    poly = np.asarray(coordinates, dtype=np.int32).reshape(-1, 1, 2)
+    xs, ys = poly[:, 0, 0], poly[:, 0, 1]
+    return {
+        'poly': poly,
+        'edges': _polygon_edges(coordinates),
+        'xmin': int(xs.min()),
+        'ymin': int(ys.min()),
+        'xmax': int(xs.max()),
+        'ymax': int(ys.max()),
+    }
+
+def _points_in_polygon_numpy(px, py, vx, vy, vx_next, vy_next):
+    """Even-odd ray cast of many points against one polygon using NumPy.
+    
+    Args:
+        px: float64 array of point x coordinates
+        py: float64 array of point y coordinates
+        vx, vy, vx_next, vy_next: Polygon edge arrays from _polygon_edges
+        
+    Returns:
+        Boolean array, True for points inside the polygon
+    """
+    px = px[:, None]
+    py = py[:, None]
+    
+    # Edges that straddle the horizontal line through each point
+    crosses = (vy <= py) ^ (vy_next <= py)
+    # Sign tells which side of the edge the point lies on
+    side = (px - vx) * (vy_next - vy) - (vx_next - vx) * (py - vy)
+    hits = crosses & (side * np.sign(vy_next - vy) > 0)
+    return np.bitwise_xor.reduce(hits, axis=1)
+
+def _any_point_in_polygon_numpy(px, py, vx, vy, vx_next, vy_next, xmin, ymin, xmax, ymax):
+    """Check whether any point lies inside a polygon using NumPy.
+    
+    Args:
+        px: float64 array of point x coordinates
+        py: float64 array of point y coordinates
+        vx, vy, vx_next, vy_next: Polygon edge arrays from _polygon_edges
+        xmin, ymin, xmax, ymax: Bounding box of the polygon
+        
+    Returns:
+        True if at least one point is inside the polygon
+    """
+    # Cheap bounding box reject, then the ray cast on the survivors
+    in_bbox = (px >= xmin) & (px <= xmax) & (py >= ymin) & (py <= ymax)
+    if not in_bbox.any():
+        return False
+    return bool(_points_in_polygon_numpy(px[in_bbox], py[in_bbox],
+                                         vx, vy, vx_next, vy_next).any())
+
+# Compiled kernels when Numba is available, vectorized NumPy otherwise
+_any_pip = kernels.any_point_in_polygon or _any_point_in_polygon_numpy
+
+def _any_point_in_zone(px, py, zone):
+    """Check whether any of several points lies inside a zone polygon.
+    
+    Args:
+        px: Array of point x coordinates
+        py: Array of point y coordinates
+        zone: Zone cache entry from _zone_geometry
+        
+    Returns:
+        True if at least one point is inside the zone
+    """
+    if len(px) == 0:
+        return False
+    return _any_pip(np.ascontiguousarray(px, dtype=np.float64),
+                    np.ascontiguousarray(py, dtype=np.float64),
+                    *zone['edges'],
+                    float(zone['xmin']), float(zone['ymin']),
+                    float(zone['xmax']), float(zone['ymax']))
+
+def _decode_yolov5_numpy(det, conf_thr):
+    """Decode raw YOLOv5 rows into confident person detections using NumPy.
+    
+    Args:
+        det: float32 array of shape [N, 5 + classes] as
+            [x, y, w, h, objectness, class scores...]
+        conf_thr: Minimum objectness and class confidence
+        
+    Returns:
+        (M, 6) float32 array of [x1, y1, x2, y2, confidence, class_id]
+    """
+    # Object confidence threshold
+    objectness = det[:, 4]
+    det = det[objectness >= conf_thr]
+    objectness = objectness[objectness >= conf_thr]
+    
+    # Find class with highest confidence for every row
+    class_confidences = det[:, 5:]
+    class_ids = class_confidences.argmax(axis=1)
+    class_confidence = class_confidences[np.arange(len(det)), class_ids]
+    
+    # Only interested in confident people (class 0 in COCO)
+    keep = (class_ids == 0) & (class_confidence >= conf_thr)
+    det = det[keep]
+    
+    # Convert [x, y, w, h] to [x1, y1, x2, y2, confidence, class_id]
+    xy = det[:, 0:2]
+    half_wh = det[:, 2:4] * 0.5
+    confidence = objectness[keep] * class_confidence[keep]
+    return np.concatenate([
+        xy - half_wh,
+        xy + half_wh,
+        confidence[:, None],
+        np.zeros((len(det), 1), dtype=det.dtype)
+    ], axis=1).astype(np.float32, copy=False)
+
+_decode_yolov5 = kernels.decode_yolov5 or _decode_yolov5_numpy
+
+# Zone test straight from raw rows; without Numba rows are decoded first
+_yolo_pip = kernels.yolo_in_polygon
+
 class ZoneDetector:
     """Detects humans in predefined zones using Hailo8L AI accelerator."""
     
@@ -35,22 +211,83 @@ class ZoneDetector:
         self.running = False
         self.thread = None
         self.lock = threading.Lock()
-        self.last_detection_time = {}
-        self.frame_buffer = {}
+        # One slot per configured camera up front, so the dict is not grown
+        # from the pipeline threads
+        self.frame_buffer = {camera.get('id'): None for camera in config.get('cameras', [])}
+        self._next_frame_due = {}
+        self._last_thumbnail = {}  # camera_id -> thumbnail of the last inferred frame
+        self._skipped_frames = {}  # camera_id -> frames skipped since then
+        # id(frame) -> thumbnail of a pipeline frame not yet inferred; it only
+        # becomes the reference once the frame reaches the result stage
+        self._pending_thumbnails = {}
+        # Pipeline frame buffers are recycled instead of allocated per frame:
+        # camera_id -> free buffers, and the frame published before the current one
+        self._frame_pool = {}
+        self._retired_frames = {}
+        self._zone_cache = {}
+        self._det_output_name = None  # Name of the model's detection output
+        self._box_scale = {}  # frame shape -> [w, h, w, h] box scale
+        self._zones_by_camera = {}
+        self._active_cameras = frozenset()
+        # Replaced wholesale by the result stage, never mutated, so readers
+        # can use them without the lock
+        self.zone_status = types.MappingProxyType({})
+        self.detection_results = types.MappingProxyType({})
+        self.last_process_time = 0  # time.monotonic() of the last result, 0 if none
+        self._last_gpio = None  # Last state sent to the GPIO controller
+        self._gpio_q = None  # GPIO worker queue while run() is active
+        self._gpio_lock = threading.Lock()  # Serializes _update_gpio callers
         
         # Initialize Hailo for person detection
+        self.hailo = None
         self.hailo_available = is_hailo_available()
+        # Detections below this are dropped before NMS; zones may set a higher one
+        self.confidence_threshold = config.get('hailo', {}).get('confidence_threshold', 0.5)
+        
+        # Pin the capture stage to CPU 0, which the cameras leave free
+        self.cpu_affinity = config.get('system', {}).get('cpu_affinity', False)
+        
+        # Capture loop pacing
+        target_fps = config.get('system', {}).get('target_fps', DEFAULT_TARGET_FPS)
+        self._period = 1.0 / max(target_fps, 1)
+        
+        # Skip inference on unchanged frames
+        motion_config = config.get('motion', {})
+        self.motion_gate = motion_config.get('enabled', True)
+        self.motion_threshold = motion_config.get('threshold', MOTION_THRESHOLD)
+        self.motion_max_skipped = motion_config.get('max_skipped_frames', MOTION_MAX_SKIPPED_FRAMES)
+        
+        # Keep a flickering detector from toggling zones (and the relay)
+        debounce_config = config.get('debounce', {})
+        self.debounce_on = debounce_config.get('on_frames', DEBOUNCE_ON_FRAMES)
+        self.debounce_off = debounce_config.get('off_frames', DEBOUNCE_OFF_FRAMES)
+        self.debounce_hold = debounce_config.get('hold', DEBOUNCE_HOLD)
+        # zone_id -> [occupied, positive streak, negative streak, time of last positive]
+        self._debounce_state = {}
         if self.hailo_available:
             model_path = config.get('hailo', {}).get('model_path', '')
             if os.path.exists(model_path):
-                self.hailo = HailoWrapper(model_path)
-                logger.info(f"Hailo AI initialized with model: {model_path}")
+                # Normally taken from the HEF; the config value must match it
+                batch_size = config.get('hailo', {}).get('batch_size')
+                self.hailo = HailoWrapper(model_path, batch_size)
+                if self.hailo.initialized:
+                    self._det_output_name = self.hailo.detection_output_name
+                    logger.info(f"Hailo AI initialized with model: {model_path}")
+                else:
+                    # Release whatever was opened before initialization failed
+                    self.hailo.cleanup()
+                    self.hailo = None
+                    self.hailo_available = False
+                    logger.error("Hailo device could not be initialized. Detection will be simulated.")
             else:
                 logger.error(f"Hailo model file not found: {model_path}")
                 self.hailo_available = False
         else:
             logger.warning("Hailo AI SDK not available. Detection will be simulated.")
         
+        # Decide once whether frames go to Hailo or to the simulation
+        self._use_hailo = self.hailo_available and self.hailo is not None and self.hailo.initialized
+        
         # Initialize zones from config
         self._init_zones()
     def _init_zones(self):
@@ -65,29 +302,76 @@ class ZoneDetector:
                         'name': zone_config.get('name', f'Zone {zone_id}'),
                         'coordinates': zone_config.get('coordinates', []),
                         'confidence_threshold': zone_config.get('confidence_threshold', 0.5),
-                        'active': False,
-                        'person_detected': False,
-                        'last_detection_time': None
+                        'active': zone_config.get('active', True)
                     }
                     logger.info(f"Zone initialized: {zone_id} for camera {camera_id}")
+        
+        # Zones saved through the web UI, keyed by zone ID
+        for zone_id, zone_config in self.config.get('zones', {}).items():
+            self.zones[zone_id] = dict(zone_config)
+            logger.info(f"Zone initialized: {zone_id} for camera {zone_config.get('camera_id')}")
+        self._build_zone_index()
+    
+    def _zone_entry(self, zone):
+        """Build the zone cache entry for one zone configuration.
+        
+        Args:
+            zone: Zone configuration dictionary with 'coordinates'
+            
+        Returns:
+            Zone geometry from _zone_geometry plus the zone's
+            'confidence_threshold'
+        """
+        entry = _zone_geometry(zone['coordinates'])
+        entry['confidence_threshold'] = zone.get('confidence_threshold', self.confidence_threshold)
+        return entry
+    
+    def _build_zone_index(self):
+        """Cache per-zone polygon geometry and the zones of each camera."""
+        self._zone_cache = {
+            zone_id: self._zone_entry(zone)
+            for zone_id, zone in self.zones.items()
+            if zone.get('coordinates')
+        }
+        zones_by_camera = {}
+        for zone_id, zone in self.zones.items():
+            zones_by_camera.setdefault(zone.get('camera_id'), []).append((zone_id, zone))
+        self._zones_by_camera = zones_by_camera
+        self._update_active_cameras()
+    
+    def _update_active_cameras(self):
+        """Recompute the cameras that have at least one active zone.
+        
+        Zones are active unless their 'active' flag is explicitly False.
+        Cameras without an active zone are not captured or inferred.
+        """
+        self._active_cameras = frozenset(
+            zone.get('camera_id') for zone in self.zones.values()
+            if zone.get('active', True)
+        )
             
     def start(self):
-        """Start the zone detector monitoring thread."""
+        """Start the detection pipeline in a background thread."""
         if self.running:
             return
         
         self.running = True
-        self.thread = threading.Thread(target=self._monitoring_loop)
+        self.thread = threading.Thread(target=self.run)
         self.thread.daemon = True
         self.thread.start()
-        logger.info("Zone detector started")
     
     def stop(self):
-        """Stop the zone detector."""
+        """Stop the detection pipeline and release the Hailo device."""
         self.running = False
         if self.thread:
             self.thread.join(timeout=2.0)
-        logger.info("Zone detector stopped")
+        
+        # Cleanup Hailo resources
+        if self.hailo is not None:
+            try:
+                self.hailo.cleanup()
+            except Exception as e:
+                logger.error(f"Error releasing Hailo resources: {e}")
     
     def get_zones(self):
         """Get all zones."""
@@ -104,146 +388,105 @@ class ZoneDetector:
         with self.lock:
             if zone_id in self.zones:
                 self.zones[zone_id]['active'] = active
-                logger.info(f"Zone {zone_id} set to {'active' if active else 'inactive'}")
-                return True
-        return False
+                self._update_active_cameras()
+                if not active:
+                    # An inactive zone must not keep the output latched
+                    self._publish_zone_state()
+                    self._debounce_state.pop(zone_id, None)
+            else:
+                return False
+        self._update_gpio()
+        logger.info(f"Zone {zone_id} set to {'active' if active else 'inactive'}")
+        return True
     
     def update_zone_coordinates(self, zone_id, coordinates):
         """Update zone coordinates."""
         with self.lock:
             if zone_id in self.zones:
                 self.zones[zone_id]['coordinates'] = coordinates
-                logger.info(f"Zone {zone_id} coordinates updated")
-                return True
-        return False
+                # A zone without a polygon has no cache entry, as in _build_zone_index
+                if coordinates:
+                    self._zone_cache[zone_id] = self._zone_entry(self.zones[zone_id])
+                else:
+                    self._zone_cache.pop(zone_id, None)
+            else:
+                return False
+        logger.info(f"Zone {zone_id} coordinates updated")
+        return True
     
     def get_last_frame(self, camera_id):
-        """Get the last processed frame for a camera."""
+        """Get the last processed frame for a camera.
+        
+        The frame is shared, not copied; copy it before modifying it. Its
+        buffer is reused once two newer frames of the camera have been
+        published, so copy it too if it must be kept longer.
+        """
         return self.frame_buffer.get(camera_id)
     
-    def _is_person_in_zone(self, person_bbox, zone_coordinates):
-        """Check if a person is in a zone.
+    def _frame_due(self, camera):
+        """Check whether a camera's next frame should be processed.
+        
+        Cameras deliver frames at the stream's native rate; this throttles
+        processing to the camera's configured fps using a monotonic clock.
         
         Args:
-            person_bbox: [x1, y1, x2, y2] bounding box
-            zone_coordinates: List of [x, y] coordinates defining a polygon
+            camera: Camera instance
             
         Returns:
-            True if person is in zone, False otherwise
+            True if enough time has passed since the last processed frame
         """
-        # Calculate center point of the bounding box
-        center_x = (person_bbox[0] + person_bbox[2]) / 2
-        center_y = (person_bbox[1] + person_bbox[3]) / 2
-        
-        # Convert zone coordinates to numpy array
-        zone_polygon = np.array(zone_coordinates, np.int32)
-        zone_polygon = zone_polygon.reshape((-1, 1, 2))
-        
-        # Check if center point is inside the polygon
-        result = cv2.pointPolygonTest(zone_polygon, (center_x, center_y), False)
-        return result >= 0
+        now = time.monotonic()
+        if now < self._next_frame_due.get(camera.camera_id, 0.0):
+            return False
+        self._next_frame_due[camera.camera_id] = now + 1.0 / max(camera.fps, 1)
+        return True
     
-    def _detect_persons(self, frame):
-        """Detect persons in a frame.
+    def _frame_changed(self, camera_id, frame):
+        """Check whether a frame differs enough from the last inferred one.
+        
+        Compares small grayscale thumbnails, which is far cheaper than
+        running inference on a frame of a static scene. A camera is still
+        re-verified after motion_max_skipped frames in a row, since this is
+        a safety monitor.
         
         Args:
-            frame: The image to detect persons in
+            camera_id: ID of the camera the frame came from
+            frame: Video frame to check
             
+        The thumbnail of a changed frame is returned rather than kept, since
+        the frame may still be dropped before inference; _commit_thumbnail
+        makes it the reference once the frame has been inferred.
+        
         Returns:
-            List of [x1, y1, x2, y2] bounding boxes
+            Tuple of (whether the frame should be inferred, its thumbnail or None)
         """
-        if self.hailo_available and hasattr(self, 'hailo'):
-            # Use Hailo for detection
-            try:
-                detections = self.hailo.infer(frame)
-                # Format: [[x1, y1, x2, y2, confidence, class_id], ...]
-                persons = []
-                
-                # Filter for person class (usually class_id 0 in YOLO models)
-                for detection in detections:
-                    if detection[5] == 0:  # Person class
-                        if detection[4] > 0.3:  # Confidence threshold
-                            persons.append(detection[:4])  # Get bounding box
-                
-                return persons
-            except Exception as e:
-                logger.error(f"Error in Hailo detection: {e}")
-                # Fall back to OpenCV detection on error
-                return self._opencv_person_detection(frame)
-        else:
-            # Use OpenCV for detection
-            return self._opencv_person_detection(frame)
+        if not self.motion_gate:
+            return True, None
+        
+        small = cv2.resize(frame, MOTION_THUMBNAIL_SIZE, interpolation=cv2.INTER_AREA)
+        small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        
+        last = self._last_thumbnail.get(camera_id)
+        skipped = self._skipped_frames.get(camera_id, 0)
+        if (last is not None and skipped < self.motion_max_skipped and
+                cv2.mean(cv2.absdiff(small, last))[0] < self.motion_threshold):
+            # Unchanged; the zones keep their previous status
+            self._skipped_frames[camera_id] = skipped + 1
+            return False, None
+        
+        return True, small
     
-    def _opencv_person_detection(self, frame):
-        """Fallback person detection using OpenCV.
+    def _commit_thumbnail(self, camera_id, frame):
+        """Make the thumbnail of an inferred frame the camera's motion reference.
         
         Args:
-            frame: The image to detect persons in
-            
-        Returns:
-            List of [x1, y1, x2, y2] bounding boxes
-        """
-        # Basic person detection using OpenCV
-        # This is a simplified version for simulation
-        height, width = frame.shape[:2]
-        
-        # For simulation, we'll just create a random detection 5% of the time
-        if np.random.random() < 0.05:
-            x1 = int(width * 0.4)
-            y1 = int(height * 0.4)
-            x2 = int(width * 0.6)
-            y2 = int(height * 0.6)
-            return [[x1, y1, x2, y2]]
-        return []
-    
-    def _monitoring_loop(self):
-        """Main monitoring loop that runs in a separate thread."""
-        while self.running:
-            try:
-                for camera_id, camera in self.camera_manager.get_cameras().items():
-                    # Get frame from camera
-                    frame = camera.get_frame()
-                    if frame is None:
-                        continue
-                    
-                    # Store frame in buffer
-                    self.frame_buffer[camera_id] = frame.copy()
-                    
-                    # Detect persons
-                    persons = self._detect_persons(frame)
-                    
-                    # Process each zone for this camera
-                    for zone_id, zone in self.zones.items():
-                        if zone['camera_id'] == camera_id and zone['active']:
-                            person_in_zone = False
-                            
-                            # Check if any person is in this zone
-                            for person_bbox in persons:
-                                if self._is_person_in_zone(person_bbox, zone['coordinates']):
-                                    person_in_zone = True
-                                    break
-                            
-                            # Update zone status
-                            with self.lock:
-                                previous_detection = self.zones[zone_id]['person_detected']
-                                self.zones[zone_id]['person_detected'] = person_in_zone
-                                
-                                if person_in_zone:
-                                    self.zones[zone_id]['last_detection_time'] = datetime.now()
-                                    
-                                    # Activate safety relay if person detected
-                                    if not previous_detection:
-                                        logger.warning(f"Person detected in zone {zone_id}")
-                                        self.gpio_controller.set_relay(True)
-                                elif previous_detection:
-                                    # Deactivate safety relay if no person detected
-                                    logger.info(f"No person detected in zone {zone_id}")
-                                    self.gpio_controller.set_relay(False)
-            except Exception as e:
-                logger.error(f"Error in zone detector: {e}")
-            
-            # Sleep to reduce CPU usage
-            time.sleep(0.1)
+            camera_id: ID of the camera the frame came from
+            frame: Pipeline frame that has been inferred
+        """
+        thumbnail = self._pending_thumbnails.pop(id(frame), None)
+        if thumbnail is not None:
+            self._last_thumbnail[camera_id] = thumbnail
+            self._skipped_frames[camera_id] = 0
     
     def draw_zones(self, frame, camera_id):
         """Draw zones on a frame.
@@ -258,37 +501,46 @@ class ZoneDetector:
         if frame is None:
             return frame
             
-        result = frame.copy()
-        
-        for zone_id, zone in self.zones.items():
-            if zone['camera_id'] == camera_id and zone['coordinates']:
+        # Group the camera's zone polygons by color, so each color is
+        # filled and outlined with one call for all of its zones
+        status = self.zone_status
+        polys_by_color = {}
+        labels = []
+        for zone_id, zone in self._zones_by_camera.get(camera_id, ()):
+            if zone['coordinates']:
                 # Choose color based on zone status
-                if zone['person_detected']:
+                if status.get(zone_id):
                     color = (0, 0, 255)  # Red if person detected
-                elif zone['active']:
+                elif zone.get('active', True):
                     color = (0, 255, 0)  # Green if active
                 else:
                     color = (255, 255, 255)  # White if inactive
                 
-                thickness = 2
-                
-                # Convert coordinates to numpy array
-                points = np.array(zone['coordinates'], np.int32)
-                points = points.reshape((-1, 1, 2))
-                
-                # Draw filled polygon with transparency
-                overlay = result.copy()
-                cv2.fillPoly(overlay, [points], color)
-                alpha = 0.3
-                cv2.addWeighted(overlay, alpha, result, 1 - alpha, 0, result)
-                
-                # Draw polygon outline
-                cv2.polylines(result, [points], True, color, thickness)
-                
-                # Draw zone name
-                if len(zone['coordinates']) > 0:
-                    text_point = (zone['coordinates'][0][0], zone['coordinates'][0][1] - 10)
-                    cv2.putText(result, zone['name'], text_point, cv2.FONT_HERSHEY_SIMPLEX, 0.6, color, 2)
+                # Polygon prepared when the zone was configured
+                polys_by_color.setdefault(color, []).append(self._zone_cache[zone_id]['poly'])
+                text_point = (zone['coordinates'][0][0], zone['coordinates'][0][1] - 10)
+                labels.append((zone.get('name', zone_id), text_point, color))
+        
+        result = frame.copy()
+        if not polys_by_color:
+            return result
+        
+        # Fill all zones into one overlay and blend it in a single pass,
+        # instead of a full-frame copy and blend per zone
+        overlay = result.copy()
+        for color, polys in polys_by_color.items():
+            cv2.fillPoly(overlay, polys, color)
+        alpha = 0.3
+        cv2.addWeighted(overlay, alpha, result, 1 - alpha, 0, result)
+        
+        # Draw polygon outlines
+        thickness = 2
+        for color, polys in polys_by_color.items():
+            cv2.polylines(result, polys, True, color, thickness)
+        
+        # Draw zone names
+        for name, text_point, color in labels:
+            cv2.putText(result, name, text_point, cv2.FONT_HERSHEY_SIMPLEX, 0.6, color, 2)
         
         return result
     
@@ -296,7 +548,7 @@ class ZoneDetector:
         """Process detections to determine if any person is in the zone.
         
         Args:
-            detections: List of detection bounding boxes
+            detections: (N, 6) float32 array of normalized detections
             frame_shape: Shape of the video frame
             camera_id: ID of the camera being processed
             zone_id: ID of the zone being checked
@@ -304,229 +556,650 @@ class ZoneDetector:
         Returns:
             True if a person is detected in the zone, False otherwise
         """
-        if zone_id not in self.zones:
+        zone = self._zone_cache.get(zone_id)
+        if zone is None or len(detections) == 0:
             return False
-            
-        zone_coords = self.zones[zone_id]['coordinates']
-        zone_polygon = np.array(zone_coords, np.int32).reshape((-1, 1, 2))
         
-        # Check if any detection overlaps with the zone
-        for detection in detections:
-            # Each detection is [x1, y1, x2, y2, confidence, class_id]
-            if detection[5] != 0:  # 0 is the class ID for person in COCO dataset
-                continue
-                
-            confidence = detection[4]
-            if confidence < 0.5:  # Confidence threshold
-                continue
-                
-            # Calculate detection box coordinates (normalized to frame size)
-            x1, y1, x2, y2 = detection[:4]
-            x1 = int(x1 * frame_shape[1])
-            y1 = int(y1 * frame_shape[0])
-            x2 = int(x2 * frame_shape[1])
-            y2 = int(y2 * frame_shape[0])
-            
-            # Check if bottom center point is in zone (person's feet)
-            bottom_center_x = (x1 + x2) // 2
-            bottom_center_y = y2
-            bottom_center = (bottom_center_x, bottom_center_y)
-            
-            if cv2.pointPolygonTest(zone_polygon, bottom_center, False) >= 0:
-                return True
-                
-        return False
+        # Keep confident persons (class 0 in the COCO dataset)
+        detections = detections[(detections[:, 5] == 0) &
+                                (detections[:, 4] >= zone['confidence_threshold'])]
+        
+        # Scale normalized boxes to the frame in one broadcast multiply
+        scale = self._box_scale.get(frame_shape)
+        if scale is None:
+            # Frame sizes are fixed per camera, so this is built once per size
+            height, width = frame_shape[:2]
+            scale = self._box_scale[frame_shape] = np.array([width, height, width, height],
+                                                            dtype=np.float32)
+        boxes_px = (detections[:, :4] * scale).astype(np.int32)
+        
+        # Bottom center point (person's feet) of every box
+        feet_x = (boxes_px[:, 0] + boxes_px[:, 2]) // 2
+        feet_y = boxes_px[:, 3]
+        
+        # Most confident person first; the compiled test stops at the first hit
+        return _any_point_in_zone(feet_x, feet_y, zone)
     
-    def _simulate_detection(self, frame, camera_id, zone_id):
-        """Simulate person detection when Hailo is not available (for development only).
+    def _detection_output(self, outputs):
+        """Find the detection tensor among the model outputs.
         
         Args:
-            frame: Video frame to process
-            camera_id: ID of the camera being processed
-            zone_id: ID of the zone being checked
+            outputs: Dictionary of output arrays by name
             
         Returns:
-            True with 20% random chance (for simulation purposes)
+            The [batch, N, 5 + classes] detection array, or None if not found
         """
-        import random
-        # 20% chance of detecting a person (for simulation only)
-        return random.random() < 0.2
+        # Normally known from the HEF when the model was loaded
+        detection_output = outputs.get(self._det_output_name)
+        if detection_output is not None:
+            return detection_output
+        
+        # Otherwise search the outputs once and remember the name
+        for output_name, output_data in outputs.items():
+            if len(output_data.shape) == 3 and output_data.shape[2] > 5:  # Detect output shape
+                self._det_output_name = output_name
+                return output_data
+        return None
     
-    def _detect_with_hailo(self, frame, camera_id, zone_id):
-        """Detect people in a frame using Hailo8L.
+    def _raw_detections_in_zone(self, raw_detections, frame_shape, zone_id):
+        """Check raw YOLOv5 rows for a person in a zone with the compiled kernel.
         
         Args:
-            frame: Video frame to process
-            camera_id: ID of the camera being processed
+            raw_detections: float32 [N, 5 + classes] rows for one frame
+            frame_shape: Shape of the video frame
             zone_id: ID of the zone being checked
             
         Returns:
             True if a person is detected in the zone, False otherwise
         """
-        if not HAILO_AVAILABLE or self.hailo_device is None:
-            return self._simulate_detection(frame, camera_id, zone_id)
-            
-        try:
-            # Preprocess image for Hailo
-            input_shape = self.input_vstream_info.shape
-            preprocessed_frame = cv2.resize(frame, (input_shape[2], input_shape[1]))
-            preprocessed_frame = preprocessed_frame.astype(np.float32) / 255.0
-            preprocessed_frame = np.expand_dims(preprocessed_frame, axis=0)  # Add batch dimension
-            
-            # Run inference
-            outputs = self.infer_streams.infer(preprocessed_frame)
-            
-            # Post-process detections (example for YOLOv5 format)
-            detections = self._postprocess_yolov5(outputs)
-            
-            # Check if any detection is in the zone
-            return self._process_detections(detections, frame.shape, camera_id, zone_id)
-        except Exception as e:
-            logger.error(f"Error during Hailo detection: {e}")
+        zone = self._zone_cache.get(zone_id)
+        if zone is None:
             return False
+        height, width = frame_shape[:2]
+        return _yolo_pip(raw_detections, *zone['edges'],
+                         zone['xmin'], zone['ymin'], zone['xmax'], zone['ymax'],
+                         float(width), float(height), self.confidence_threshold,
+                         zone['confidence_threshold'])
     
-    def _postprocess_yolov5(self, outputs):
-        """Post-process YOLOv5 model outputs to get detection bounding boxes.
+    def _postprocess_yolov5(self, rows):
+        """Post-process YOLOv5 rows of one frame into detection bounding boxes.
         
         Args:
-            outputs: Raw output from Hailo inference
+            rows: float32 [N, 5 + classes] rows of one frame from
+                HailoWrapper.detection_rows
             
         Returns:
-            List of detection bounding boxes [x1, y1, x2, y2, confidence, class_id]
+            (N, 6) float32 array of [x1, y1, x2, y2, confidence, class_id]
         """
-        # Note: This is a simplified implementation and should be adapted to the specific model used
-        # Format depends on the exact model exported to Hailo
-        
-        # Example implementation for YOLOv5 with output shape [1, 25200, 85] (80 classes + 5 box params)
         try:
-            # Get detection output tensor (varies based on model)
-            detection_output = None
-            for output_name, output_data in outputs.items():
-                if len(output_data.shape) == 3 and output_data.shape[2] > 5:  # Detect output shape
-                    detection_output = output_data
-                    break
-            
-            if detection_output is None:
-                logger.error("Could not find detection output tensor")
-                return []
+            # Decode all rows at once
+            detections = _decode_yolov5(rows, self.confidence_threshold)
             
-            # Process detections
-            detections = []
-            detection_data = detection_output[0]  # First batch
-            
-            for detection in detection_data:
-                confidence = detection[4]  # Object confidence
-                
-                if confidence < 0.5:  # Confidence threshold
-                    continue
-                
-                # Find class with highest confidence
-                class_confidences = detection[5:]
-                class_id = np.argmax(class_confidences)
-                class_confidence = class_confidences[class_id]
-                
-                if class_confidence < 0.5:  # Class confidence threshold
-                    continue
-                
-                # Only interested in people (class 0 in COCO)
-                if class_id != 0:  # Not a person
-                    continue
-                
-                # Extract bounding box
-                x, y, w, h = detection[0:4]
-                x1 = x - w/2
-                y1 = y - h/2
-                x2 = x + w/2
-                y2 = y + h/2
-                
-                # Add detection
-                detections.append([x1, y1, x2, y2, confidence * class_confidence, class_id])
+            # Suppress duplicate boxes on the same person. Kept boxes come
+            # back most confident first, so zone tests see them in that order.
+            if len(detections) > 1:
+                detections = detections[non_max_suppression(detections[:, :4], detections[:, 4])]
             
             return detections
         except Exception as e:
             logger.error(f"Error in YOLOv5 post-processing: {e}")
-            return []
+            return NO_DETECTIONS
     
     def run(self):
-        """Run the zone detection loop."""
+        """Run the zone detection pipeline.
+        
+        Work is split into stages connected by bounded queues so host
+        preprocessing and post-processing overlap with inference:
+        capture (this thread) -> preprocess -> send -> receive -> zone update
+        -> GPIO.
+        Sending and receiving run in separate threads, so the next frame is
+        written to the device while the previous one is still being computed.
+        Stages in front of the device drop their oldest batch when the next
+        stage falls behind, so capture never stalls on a slow stage.
+        """
         self.running = True
         logger.info("Zone detector started")
         
+        # Each stage gets its queues as arguments, so a stage still running
+        # after the joins below time out never sees another run's queues
+        preprocess_q = self._preprocess_q = queue.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+        infer_q = self._infer_q = queue.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+        inflight_q = self._inflight_q = queue.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+        result_q = self._result_q = queue.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+        gpio_q = queue.Queue(maxsize=GPIO_QUEUE_SIZE)
+        with self._gpio_lock:
+            self._gpio_q = gpio_q
+        self._dropped_batches = 0
+        # Per-stage [count, total seconds, max seconds] since the last stats log
+        self._timings = {'infer': [0, 0.0, 0.0], 'post': [0, 0.0, 0.0]}
+        stages = [
+            threading.Thread(target=stage, args=queues, daemon=True)
+            for stage, queues in (
+                (self._preprocess_stage, (preprocess_q, infer_q)),
+                (self._send_stage, (infer_q, inflight_q)),
+                (self._receive_stage, (inflight_q, result_q)),
+                (self._result_stage, (result_q, gpio_q)),
+                (self._gpio_stage, (gpio_q,)),
+            )
+        ]
+        for stage in stages:
+            stage.start()
+        
+        # Pinned only after the other stages are started, since threads
+        # inherit the CPU mask of the thread that creates them
+        if self.cpu_affinity:
+            pin_current_thread(0)
+        
         try:
-            while self.running:
-                # Process each camera
-                for camera_id, camera in self.camera_manager.get_all_cameras().items():
-                    # Skip if camera is not connected
-                    if not camera.connected:
-                        continue
-                    
-                    # Get the latest frame
-                    frame = camera.get_frame()
-                    if frame is None:
-                        continue
-                    
-                    # Process each zone for this camera
-                    for zone_id, zone_config in self.zones.items():
-                        # Skip zones not associated with this camera
-                        if zone_config.get('camera_id') != camera_id:
-                            continue
-                        
-                        # Detect people in zone
-                        has_person = self._detect_with_hailo(frame, camera_id, zone_id)
-                        
-                        # Update zone status
-                        with self.lock:
-                            self.zone_status[zone_id] = has_person
-                            
-                            # Annotate detection for UI
-                            if 'coordinates' in zone_config:
-                                zone_coords = zone_config['coordinates']
-                                # Deep copy frame to avoid modifying original
-                                annotated_frame = frame.copy()
-                                zone_polygon = np.array(zone_coords, np.int32).reshape((-1, 1, 2))
-                                color = (0, 255, 0) if not has_person else (0, 0, 255)  # Green if clear, Red if person detected
-                                cv2.polylines(annotated_frame, [zone_polygon], True, color, 2)
-                                
-                                # Store annotated frame for UI
-                                self.detection_results[zone_id] = {
-                                    'frame': annotated_frame,
-                                    'has_person': has_person,
-                                    'timestamp': time.time()
-                                }
-                    
-                # Update GPIO based on all zone statuses
-                any_zone_active = any(self.zone_status.values())
-                if any_zone_active:
-                    self.gpio_controller.activate()
-                else:
-                    self.gpio_controller.deactivate()
-                    
-                self.last_process_time = time.time()
-                
-                # Prevent CPU overload
-                time.sleep(0.01)
-                
+            self._capture_stage(preprocess_q)
         except Exception as e:
             logger.error(f"Error in zone detector: {e}")
         finally:
             self.running = False
+            # The sentinel is forwarded stage to stage, shutting each one
+            # down; the GPIO worker hands the output back to _update_gpio
+            preprocess_q.put(None)
+            for stage in stages:
+                stage.join(timeout=2.0)
             logger.info("Zone detector stopped")
     
-    def stop(self):
-        """Stop the zone detector."""
-        self.running = False
+    def _put(self, stage_queue, item):
+        """Queue an item for the next stage, blocking while it is busy.
         
-        # Cleanup Hailo resources
-        if HAILO_AVAILABLE and self.hailo_device is not None:
+        Used after the device, where every sent batch must be received and
+        its result applied.
+        
+        Returns:
+            False if the detector stopped before the item could be queued
+        """
+        while self.running:
+            try:
+                stage_queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+    
+    def _put_latest(self, stage_queue, item):
+        """Queue an item for the next stage, dropping the oldest one if full.
+        
+        Used in front of the device, where a stale frame is worth less than
+        the newest one and a slow stage must not stall capture.
+        """
+        while True:
             try:
-                if self.infer_streams is not None:
-                    self.infer_streams.stop()
-                if self.hailo_network is not None:
-                    self.hailo_device.release(self.hailo_network)
-                self.hailo_device.close()
-                logger.info("Hailo resources released")
+                stage_queue.put_nowait(item)
+                return
+            except queue.Full:
+                try:
+                    dropped = stage_queue.get_nowait()
+                    self._dropped_batches += 1
+                except queue.Empty:
+                    continue
+                # Items are (camera_ids, ..., frames); preprocessed ones are
+                # (camera_ids, tensor, frames)
+                self._discard_frames(dropped[0], dropped[-1])
+                if len(dropped) == 3 and dropped[1] is not None:
+                    self.hailo.release_batch(dropped[1])
+    
+    def _copy_frame(self, camera_id, frame):
+        """Copy a camera frame into a pipeline buffer of that camera.
+        
+        Buffers come back through _recycle_frames, so in steady state
+        frames are copied without allocating.
+        
+        Args:
+            camera_id: ID of the camera the frame came from
+            frame: Frame from the camera's own ring buffer
+            
+        Returns:
+            Copy of the frame owned by the pipeline
+        """
+        pool = self._frame_pool.get(camera_id)
+        if pool is None:
+            pool = self._frame_pool[camera_id] = deque()
+        try:
+            buffer = pool.pop()
+        except IndexError:
+            return frame.copy()
+        if buffer.shape != frame.shape or buffer.dtype != frame.dtype:
+            # The camera changed resolution; let the old buffer go
+            return frame.copy()
+        np.copyto(buffer, frame)
+        return buffer
+    
+    def _recycle_frames(self, camera_ids, frames):
+        """Return pipeline frame buffers that are no longer referenced.
+        
+        Args:
+            camera_ids: IDs of the cameras the frames belong to
+            frames: Buffers from _copy_frame
+        """
+        for camera_id, frame in zip(camera_ids, frames):
+            pool = self._frame_pool.get(camera_id)
+            if pool is not None:
+                pool.append(frame)
+    
+    def _discard_frames(self, camera_ids, frames):
+        """Recycle pipeline frames that will not be inferred.
+        
+        Their thumbnails are dropped too, so a frame that was never
+        inferred does not become a camera's motion reference.
+        
+        Args:
+            camera_ids: IDs of the cameras the frames belong to
+            frames: Buffers from _copy_frame
+        """
+        for frame in frames:
+            self._pending_thumbnails.pop(id(frame), None)
+        self._recycle_frames(camera_ids, frames)
+    
+    def _record_timing(self, stage, seconds):
+        """Add one stage duration to the timing statistics.
+        
+        Args:
+            stage: 'infer' or 'post'
+            seconds: Duration of the stage for one batch
+        """
+        stats = self._timings[stage]
+        stats[0] += 1
+        stats[1] += seconds
+        if seconds > stats[2]:
+            stats[2] = seconds
+    
+    def _log_pipeline_stats(self):
+        """Log queue depths, dropped batches and stage timings, then reset the timings."""
+        logger.debug(
+            f"Pipeline queues: preprocess={self._preprocess_q.qsize()} "
+            f"infer={self._infer_q.qsize()} inflight={self._inflight_q.qsize()} "
+            f"result={self._result_q.qsize()} dropped={self._dropped_batches}"
+        )
+        for stage in self._timings:
+            count, total, high = self._timings[stage]
+            self._timings[stage] = [0, 0.0, 0.0]
+            if count:
+                logger.debug(
+                    f"Pipeline {stage}: {count} batches, avg {total / count * 1000:.1f} ms, "
+                    f"max {high * 1000:.1f} ms"
+                )
+    
+    def _capture_stage(self, preprocess_q):
+        """Collect due frames from all connected cameras into batches.
+        
+        Args:
+            preprocess_q: Queue of (camera_ids, frames) batches to preprocess
+        """
+        batch_size = self.hailo.batch_size if self._use_hailo else 1
+        frame_available = self.camera_manager.frame_available
+        next_stats = time.monotonic() + PIPELINE_STATS_INTERVAL
+        next_tick = time.perf_counter()
+        while self.running:
+            next_tick += self._period
+            # Cleared before collecting, so a frame that arrives meanwhile
+            # wakes the next pass instead of being missed
+            frame_available.clear()
+            camera_ids = []
+            frames = []
+            active_cameras = self._active_cameras
+            for camera_id, camera in self.camera_manager.get_all_cameras().items():
+                # Skip if camera is not connected or none of its zones is active
+                if not camera.connected or camera_id not in active_cameras:
+                    continue
+                
+                # Skip until the camera's next frame is due
+                if not self._frame_due(camera):
+                    continue
+                
+                # Get the latest frame. The camera reuses its buffers, so it is
+                # copied into a pipeline buffer once it passes the change gate.
+                frame = camera.get_frame()
+                if frame is None:
+                    continue
+                
+                # Skip inference when nothing in the scene has changed
+                changed, thumbnail = self._frame_changed(camera_id, frame)
+                if not changed:
+                    continue
+                frame = self._copy_frame(camera_id, frame)
+                if thumbnail is not None:
+                    self._pending_thumbnails[id(frame)] = thumbnail
+                camera_ids.append(camera_id)
+                frames.append(frame)
+            
+            # One inference per batch of cameras
+            for start in range(0, len(frames), batch_size):
+                end = start + batch_size
+                self._put_latest(preprocess_q, (camera_ids[start:end], frames[start:end]))
+            
+            if time.monotonic() >= next_stats:
+                self._log_pipeline_stats()
+                next_stats += PIPELINE_STATS_INTERVAL
+            
+            # Sleep out the rest of this period, then until a camera delivers
+            # a new frame. When the loop falls behind, start a fresh period
+            # rather than running back-to-back to catch up.
+            delay = next_tick - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                next_tick = time.perf_counter()
+            frame_available.wait(timeout=self._period)
+    
+    def _preprocess_stage(self, preprocess_q, infer_q):
+        """Resize and convert a batch of frames into a model input tensor.
+        
+        Args:
+            preprocess_q: Queue of (camera_ids, frames) batches
+            infer_q: Queue of (camera_ids, tensor, frames) batches to send
+        """
+        while True:
+            item = preprocess_q.get()
+            if item is None:
+                infer_q.put(None)
+                return
+            
+            camera_ids, frames = item
+            try:
+                tensor = None
+                if self._use_hailo:
+                    tensor = self.hailo.preprocess_batch(frames)
+                self._put_latest(infer_q, (camera_ids, tensor, frames))
             except Exception as e:
-                logger.error(f"Error releasing Hailo resources: {e}")
+                logger.error(f"Error preprocessing frames from cameras {camera_ids}: {e}")
+                self._discard_frames(camera_ids, frames)
+    
+    def _send_stage(self, infer_q, inflight_q):
+        """Write preprocessed batches to the device.
+        
+        Args:
+            infer_q: Queue of (camera_ids, tensor, frames) batches
+            inflight_q: Queue of batches waiting for their device output
+        """
+        while True:
+            item = infer_q.get()
+            if item is None:
+                inflight_q.put(None)
+                return
+            
+            camera_ids, tensor, frames = item
+            sent = False
+            if tensor is not None:
+                sent = self.hailo.send(tensor)
+                # The write has copied the tensor, so it can be refilled
+                self.hailo.release_batch(tensor)
+                if not sent:
+                    # Inference failed; drop the frames rather than simulate
+                    self._discard_frames(camera_ids, frames)
+                    continue
+            # At most PIPELINE_QUEUE_SIZE batches wait on the device
+            self._put(inflight_q, (camera_ids, frames, sent, time.perf_counter()))
+    
+    def _receive_stage(self, inflight_q, result_q):
+        """Read device outputs in the order their inputs were sent.
+        
+        Args:
+            inflight_q: Queue of batches waiting for their device output
+            result_q: Queue of (camera_ids, outputs, frames) to post-process
+        """
+        while True:
+            item = inflight_q.get()
+            if item is None:
+                result_q.put(None)
+                return
+            
+            camera_ids, frames, sent, sent_at = item
+            outputs = None
+            if sent:
+                outputs = self.hailo.recv()
+                if outputs is None:
+                    self._discard_frames(camera_ids, frames)
+                    continue
+                self._record_timing('infer', time.perf_counter() - sent_at)
+            self._put(result_q, (camera_ids, outputs, frames))
+    
+    def _result_stage(self, result_q, gpio_q):
+        """Post-process detections, update zones, annotate and drive GPIO.
+        
+        Args:
+            result_q: Queue of (camera_ids, outputs, frames) to post-process
+            gpio_q: Queue of the GPIO worker, passed the shutdown sentinel
+        """
+        while True:
+            item = result_q.get()
+            if item is None:
+                gpio_q.put(None)
+                return
+            
+            camera_ids, outputs, frames = item
+            started = time.perf_counter()
+            try:
+                # Confident rows of every frame, dequantized only after the
+                # objectness threshold
+                rows = None
+                if outputs is not None:
+                    raw_output = self._detection_output(outputs)
+                    if raw_output is not None:
+                        rows = self.hailo.detection_rows(raw_output, self.confidence_threshold)
+                    else:
+                        logger.error("Could not find detection output tensor")
+                
+                # Scatter the batch outputs back to their cameras
+                for i, (camera_id, frame) in enumerate(zip(camera_ids, frames)):
+                    self._commit_thumbnail(camera_id, frame)
+                    if rows is not None and _yolo_pip is not None:
+                        # With Numba, zones are tested straight from the rows
+                        self._update_camera_zones(camera_id, frame, None, rows[i])
+                        continue
+                    detections = None
+                    if rows is not None:
+                        detections = self._postprocess_yolov5(rows[i])
+                    elif outputs is not None:
+                        detections = NO_DETECTIONS
+                    self._update_camera_zones(camera_id, frame, detections)
+                self._update_gpio()
+                self.last_process_time = time.monotonic()
+            except Exception as e:
+                logger.error(f"Error in zone detector: {e}")
+            self._record_timing('post', time.perf_counter() - started)
+    
+    def _update_camera_zones(self, camera_id, frame, detections, raw_detections=None):
+        """Update the status of every zone on a camera from its detections.
+        
+        Args:
+            camera_id: ID of the camera the frame came from
+            frame: Video frame the detections belong to
+            detections: Detection array, or None to simulate detection
+            raw_detections: Raw YOLOv5 rows to test with the compiled kernel
+                instead of detections
+        """
+        # The pipeline owns its frame copy, so publish it without another copy
+        previous_frame = self.frame_buffer.get(camera_id)
+        self.frame_buffer[camera_id] = frame
+        
+        zones = self._zones_by_camera.get(camera_id, ())
+        
+        # Without detections (no Hailo), draw one simulated result per zone at once
+        simulated = None
+        if detections is None and raw_detections is None:
+            simulated = np.random.random_sample(len(zones)) < 0.2
+        
+        # Results for this camera's zones, merged into the published
+        # snapshots at the end
+        camera_status = {}
+        camera_results = {}
+        timestamp = time.monotonic()
+        
+        # Test the camera's detections against each of its active zones
+        for i, (zone_id, zone_config) in enumerate(zones):
+            if not zone_config.get('active', True):
+                self._debounce_state.pop(zone_id, None)
+                continue
+            
+            # Detect people in zone
+            if simulated is not None:
+                has_person = bool(simulated[i])
+            elif raw_detections is not None:
+                has_person = self._raw_detections_in_zone(raw_detections, frame.shape, zone_id)
+            else:
+                has_person = self._process_detections(detections, frame.shape, camera_id, zone_id)
+            has_person = self._debounce(zone_id, has_person, timestamp)
+            
+            # Update zone status
+            camera_status[zone_id] = has_person
+            
+            # Keep the frame for the UI; it is annotated on request only
+            camera_results[zone_id] = {
+                'frame': frame,
+                'has_person': has_person,
+                'timestamp': timestamp
+            }
+        
+        # Publish under the lock, so a zone deactivated or removed while
+        # the detections were tested is not brought back with a stale result
+        with self.lock:
+            self._publish_zone_state(camera_status, camera_results)
+        
+        # Readers may still hold the previous frame, so recycle the one
+        # published before it
+        retired = self._retired_frames.get(camera_id)
+        self._retired_frames[camera_id] = previous_frame
+        if retired is not None and retired is not frame:
+            self._recycle_frames((camera_id,), (retired,))
+    
+    def _publish_zone_state(self, status_updates=None, result_updates=None):
+        """Publish new zone status and detection result snapshots.
+        
+        Only zones that are still configured and active are kept, both
+        from the current snapshots and from the updates. Must be called
+        with self.lock held.
+        
+        Args:
+            status_updates: Dictionary of new has_person values by zone ID
+            result_updates: Dictionary of new detection results by zone ID
+        """
+        zones_config = self.zones
+        
+        def is_active(zone_id):
+            zone = zones_config.get(zone_id)
+            return zone is not None and zone.get('active', True)
+        
+        next_status = {k: v for k, v in self.zone_status.items() if is_active(k)}
+        next_results = {k: v for k, v in self.detection_results.items() if is_active(k)}
+        if status_updates:
+            next_status.update((k, v) for k, v in status_updates.items() if is_active(k))
+        if result_updates:
+            next_results.update((k, v) for k, v in result_updates.items() if is_active(k))
+        
+        # Attribute assignment is atomic, so readers see old or new, never partial
+        self.zone_status = types.MappingProxyType(next_status)
+        self.detection_results = types.MappingProxyType(next_results)
+    
+    def _debounce(self, zone_id, has_person, now):
+        """Filter a zone's per-frame result through its debounce state.
+        
+        Args:
+            zone_id: ID of the zone
+            has_person: Whether a person was detected in the zone on this frame
+            now: time.monotonic() timestamp of the frame's result
+            
+        Returns:
+            Whether the zone is considered occupied
+        """
+        state = self._debounce_state.get(zone_id)
+        if state is None:
+            state = self._debounce_state[zone_id] = [False, 0, 0, 0.0]
+        
+        if has_person:
+            state[1] += 1
+            state[2] = 0
+            state[3] = now
+            if state[1] >= self.debounce_on:
+                state[0] = True
+        else:
+            state[1] = 0
+            state[2] += 1
+            if state[2] >= self.debounce_off and now - state[3] >= self.debounce_hold:
+                state[0] = False
+        return state[0]
+        
+    def _update_gpio(self):
+        """Update the GPIO output from the status of all zones.
+        
+        Called by the result stage and whenever zones are deactivated or
+        replaced, since cameras without an active zone produce no results
+        that would release the output. While run() is active the change is
+        queued for the GPIO worker, otherwise it is applied directly.
+        """
+        with self._gpio_lock:
+            any_zone_active = any(self.zone_status.values())
+            # Only touch the pin when the combined state changes
+            if any_zone_active == self._last_gpio:
+                return
+            self._last_gpio = any_zone_active
+            
+            gpio_q = self._gpio_q
+            if gpio_q is not None:
+                while True:
+                    try:
+                        gpio_q.put_nowait(any_zone_active)
+                        return
+                    except queue.Full:
+                        # The worker applies only the newest state anyway
+                        try:
+                            gpio_q.get_nowait()
+                        except queue.Empty:
+                            pass
+        
+        try:
+            if any_zone_active:
+                self.gpio_controller.activate()
+            else:
+                self.gpio_controller.deactivate()
+        except Exception as e:
+            logger.error(f"Error updating GPIO output: {e}")
+    
+    def _gpio_stage(self, gpio_q):
+        """Apply queued GPIO output changes off the result stage.
+        
+        Relay writes and the controller's lock never delay zone updates.
+        States queued while a write was in progress are coalesced into
+        the newest one. On shutdown the output goes back to being driven
+        directly by _update_gpio.
+        
+        Args:
+            gpio_q: Queue of relay states, ended by None
+        """
+        while True:
+            state = gpio_q.get()
+            stopping = state is None
+            while not stopping:
+                try:
+                    newer = gpio_q.get_nowait()
+                except queue.Empty:
+                    break
+                if newer is None:
+                    stopping = True
+                else:
+                    state = newer
+            
+            if state is not None:
+                try:
+                    if state:
+                        self.gpio_controller.activate()
+                    else:
+                        self.gpio_controller.deactivate()
+                except Exception as e:
+                    logger.error(f"Error updating GPIO output: {e}")
+            if stopping:
+                break
+        
+        # Drive the output directly from now on, re-applying the current
+        # state in case a change was queued after the sentinel
+        with self._gpio_lock:
+            if self._gpio_q is gpio_q:
+                self._gpio_q = None
+                self._last_gpio = None
+        self._update_gpio()
     
     def update_zones(self, zones_config):
         """Update zone configurations.
@@ -536,19 +1209,38 @@ class ZoneDetector:
         """
         with self.lock:
             self.zones = zones_config
-            # Clear statuses for zones that no longer exist
-            for zone_id in list(self.zone_status.keys()):
-                if zone_id not in zones_config:
-                    del self.zone_status[zone_id]
-            logger.info(f"Zone configurations updated: {len(zones_config)} zones")
+            self._build_zone_index()
+            # Clear statuses for zones that no longer exist or are inactive
+            self._publish_zone_state()
+            self._debounce_state = {
+                zone_id: state for zone_id, state in self._debounce_state.items()
+                if zone_id in zones_config
+            }
+        self._update_gpio()
+        logger.info(f"Zone configurations updated: {len(zones_config)} zones")
     
-    def get_zones(self):
-        """Get the current zone configurations.
+    def get_annotated_frame(self, zone_id):
+        """Get the last frame processed for a zone with the zone outline drawn.
+        
+        The outline is only rendered here, when the UI asks for it, rather
+        than for every zone on every processed frame.
         
+        Args:
+            zone_id: ID of the zone
+            
         Returns:
-            Dictionary of zone configurations
+            Annotated frame, or None if no frame has been processed for the zone
         """
-        return self.zones
+        result = self.detection_results.get(zone_id)
+        zone = self._zone_cache.get(zone_id)
+        if result is None or zone is None:
+            return None
+        
+        # Copy so the stored frame stays unmodified
+        annotated_frame = result['frame'].copy()
+        color = (0, 255, 0) if not result['has_person'] else (0, 0, 255)  # Green if clear, Red if person detected
+        cv2.polylines(annotated_frame, [zone['poly']], True, color, 2)
+        return annotated_frame
     
     def get_zone_status(self):
         """Get the current status of all zones.
@@ -556,11 +1248,13 @@ class ZoneDetector:
         Returns:
             Dictionary with zone status information
         """
-        with self.lock:
-            status = {}
-            for zone_id, is_active in self.zone_status.items():
-                status[zone_id] = {
-                    'has_person': is_active,
-                    'last_updated': self.last_process_time
-                }
-            return status
+        # Immutable snapshot, read without the lock
+        zone_status = self.zone_status
+        last_updated = self.last_process_time
+        if last_updated:
+            # Monotonic in the hot path; converted to wall clock only here
+            last_updated = time.time() - (time.monotonic() - last_updated)
+        return {
+            zone_id: {'has_person': is_active, 'last_updated': last_updated}
+            for zone_id, is_active in zone_status.items()
+        }
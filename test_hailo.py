@@ -6,6 +6,15 @@ Hailo8L Test Script for AMS Zone Monitor
 
 This script tests if the Hailo8L device is properly connected and can run inferences.
 Run this before setting up the full application to verify your hardware setup.
+
+For best performance the model should take uint8 input and normalize on the
+device, so no per-frame float conversion happens on the Raspberry Pi. When
+compiling the .hef with the Hailo Dataflow Compiler, add this line to the
+model script (.alls):
+
+    normalization1 = normalization([0.0, 0.0, 0.0], [255.0, 255.0, 255.0])
+
+The inference test below reports which input format the model uses.
 """
 
 import os
@@ -53,6 +62,7 @@ def test_model_inference(model_path):
         from hailo_platform import HEF
         from hailo_platform import InferVStreams
         from hailo_platform import ConfigureParams
+        from hailo_platform import FormatType
 
         if not os.path.exists(model_path):
             logger.error(f"✗ Model file not found: {model_path}")
@@ -71,8 +81,17 @@ def test_model_inference(model_path):
         input_shape = input_vstream_info.shape
         logger.info(f"Model input shape: {input_shape}")
         
-        # Create dummy input (1x3x640x640 example - adjust based on your model)
-        dummy_input = np.random.rand(*input_shape).astype(np.float32)
+        # Check whether normalization is compiled into the model
+        input_format = input_vstream_info.format.type
+        logger.info(f"Model input format: {input_format}")
+        if input_format == FormatType.UINT8:
+            logger.info("✓ Model takes uint8 input; normalization runs on the device")
+            dummy_input = np.random.randint(0, 256, size=input_shape, dtype=np.uint8)
+        else:
+            logger.warning("Model takes float input; frames will be normalized on the host")
+            logger.warning("Recompile the .hef with the normalization line from this script's docstring")
+            # Create dummy input (1x3x640x640 example - adjust based on your model)
+            dummy_input = np.random.rand(*input_shape).astype(np.float32)
         
         # Run inference
         infer_streams = InferVStreams(device, network)